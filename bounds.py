@@ -1,42 +1,33 @@
-from panda3d.core import Vec3
+import numpy as np
 
 
 class Bounds:
 
     def __init__(self, vertices):
-        """vertices: list of Vec3
+        """vertices: numpy.ndarray of shape (n, 3)
         """
+        vertices = np.asarray(vertices, dtype=np.float32)
         self.top_right = self.get_top_right(vertices)
         self.bottom_left = self.get_bottom_left(vertices)
-        self.height = self.top_right.z - self.bottom_left.z
-        self.width = self.top_right.x - self.bottom_left.x
+        self.height = self.top_right[2] - self.bottom_left[2]
+        self.width = self.top_right[0] - self.bottom_left[0]
         self.center = self.get_center(vertices)
-        self.radius = max(rad for rad in self.get_radius(vertices))
+        self.radius = self.get_radius(vertices).max()
 
     def get_top_right(self, vertices):
-        x = max(vertices, key=lambda vertex: vertex.x).x
-        y = min(vertices, key=lambda vertex: vertex.y).y
-        z = max(vertices, key=lambda vertex: vertex.z).z
+        x, _, z = vertices.max(axis=0)
+        y = vertices[:, 1].min()
 
-        return Vec3(x, y, z)
+        return np.array([x, y, z], dtype=np.float32)
 
     def get_bottom_left(self, vertices):
-        x = min(vertices, key=lambda vertex: vertex.x).x
-        y = max(vertices, key=lambda vertex: vertex.y).y
-        z = min(vertices, key=lambda vertex: vertex.z).z
+        x, _, z = vertices.min(axis=0)
+        y = vertices[:, 1].max()
 
-        return Vec3(x, y, z)
+        return np.array([x, y, z], dtype=np.float32)
 
     def get_center(self, vertices):
-        cnt = len(vertices)
-        total = Vec3()
-
-        for vertex in vertices:
-            total += vertex
-        return total / cnt
+        return vertices.mean(axis=0)
 
     def get_radius(self, vertices):
-        for vertex in vertices:
-            vec = vertex - self.center
-            radius = sum(v ** 2 for v in vec) ** 0.5
-            yield radius
\ No newline at end of file
+        return np.linalg.norm(vertices - self.center, axis=1)
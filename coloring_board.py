@@ -1,23 +1,30 @@
-from collections import defaultdict
+import argparse
 from enum import Enum, auto
 from textwrap import wrap
 
 from direct.showbase.ShowBase import ShowBase
 from direct.showbase.ShowBaseGlobal import globalClock
-from panda3d.core import WindowProperties, PandaNode, NodePath
+from panda3d.core import WindowProperties, PandaNode, NodePath, loadPrcFileData
+from panda3d.core import FrameBufferProperties, GraphicsPipe, GraphicsOutput
+from panda3d.core import Camera, OrthographicLens, CardMaker, Filename, TexturePool
 from panda3d.core import Vec3, LColor, Point3, Vec2
 from panda3d.core import GeomVertexFormat, GeomVertexData, GeomVertexArrayFormat
-from panda3d.core import Geom, GeomTriangles, GeomVertexReader, GeomVertexWriter
+from panda3d.core import Geom, GeomTriangles
 from panda3d.core import GeomNode
 from panda3d.core import BitMask32
+from panda3d.core import Texture, TextureStage, SamplerState
 from panda3d.bullet import BulletWorld, BulletDebugNode
 from panda3d.bullet import BulletRigidBodyNode
 from panda3d.bullet import BulletConvexHullShape
 import numpy as np
 
-from db_manage import get_vertices, get_faces
+from db_manage import get_vertices
 from tkwindow import WindowTk
-from bounds import Bounds
+from polyhedron_model import PolyhedronModel
+from paint import PaintCanvas
+from history import ColorHistory
+from event_loop import EventPump
+from gallery import Gallery
 
 
 class Colors(Enum):
@@ -42,16 +49,25 @@ class Mouse(Enum):
 
 class ColoringBoard(ShowBase):
 
-    def __init__(self):
+    # degrees the camera turns per unit of mouse movement; the window is 2 units wide.
+    ROTATION_SPEED = 180
+    CAMERA_DISTANCE = 15
+
+    def __init__(self, legacy_loop=False, stats_interval=None):
+        if not legacy_loop:
+            loadPrcFileData('', 'tk-main-loop 0')
         super().__init__(windowType='none')
         self.world = BulletWorld()
         self.polh = Polyhedron(self.world)
+        self.gallery = Gallery(self.polh)
 
         self.startTk()
+        self.events = EventPump(self, legacy=legacy_loop, stats_interval=stats_interval)
         root = self.tkRoot
         root.geometry('1080x640')
         root.resizable(False, False)
         self.app = WindowTk(root, self)
+        root.protocol('WM_DELETE_WINDOW', self.app.close)
         root.bind('<Escape>', self.app.close)
 
         props = WindowProperties()
@@ -65,7 +81,7 @@ class ColoringBoard(ShowBase):
         self.camera_np = NodePath(PandaNode('cameraNode'))
         self.camera_np.reparentTo(self.render)
         self.camera.reparentTo(self.camera_np)
-        self.camera.setPos(15, 0, 0)
+        self.camera.setPos(self.CAMERA_DISTANCE, 0, 0)
         self.camera.lookAt(0, 0, 0)
 
         self.debug = self.render.attachNewNode(BulletDebugNode('debug'))
@@ -75,9 +91,16 @@ class ColoringBoard(ShowBase):
         self.dragging = 0
         self.clicked_pos = None
         self.state = None
+        self.paint_mode = False
 
         self.accept('mouse1', self.click)
         self.accept('mouse1-up', self.release)
+        self.accept('mouse3', self.fill_same_faces)
+        self.accept('wheel_up', self.zoom, [0.9])
+        self.accept('wheel_down', self.zoom, [1.1])
+        # only in the Panda3D window, so that the Tk entries keep their own Ctrl+Z
+        self.accept('control-z', self.undo)
+        self.accept('control-y', self.redo)
         self.taskMgr.add(self.update, 'update')
 
     def click(self):
@@ -91,43 +114,97 @@ class ColoringBoard(ShowBase):
         node_path = NodePath(PandaNode(filepath.stem))
         obj = node_path.attachNewNode(geom_node)
         obj.setTwoSided(True)
+        self.polh.save_texture(obj, filepath)
         node_path.writeBamFile(filepath)
 
     def open_file(self, filepath):
+        self.close_gallery()
         self.polh.clear()
         model = self.loader.loadModel(filepath)
         self.polh.disassemble(model)
 
-    def change_color(self, m_pos):
+    def open_gallery(self, filepaths):
+        models = [self.polh.read_model(self.loader.loadModel(path)) for path in filepaths]
+        self.show_gallery(models)
+
+    def show_category_gallery(self, names):
+        models = [PolyhedronModel.from_db(name, self.polh.colors)
+                  for name in names if get_vertices(name)]
+        self.show_gallery(models)
+
+    def show_gallery(self, models):
+        """Show all the models at once instead of the polyhedron to color.
+        """
+        self.polh.clear()
+        size = self.gallery.set_models(models)
+        self.camera.setX(max(self.CAMERA_DISTANCE, size * 1.5))
+
+    def close_gallery(self):
+        if self.gallery.active:
+            self.gallery.clear()
+            self.camera.setX(self.CAMERA_DISTANCE)
+
+    def zoom(self, rate):
+        self.camera.setX(max(self.camera.getX() * rate, 2))
+
+    def pick(self, m_pos):
         near_pos = Point3()
         far_pos = Point3()
         self.camLens.extrude(m_pos, near_pos, far_pos)
         from_pos = self.render.getRelativePoint(self.cam, near_pos)
         to_pos = self.render.getRelativePoint(self.cam, far_pos)
-        result = self.world.rayTestClosest(from_pos, to_pos)
+        return self.world.rayTestClosest(from_pos, to_pos)
+
+    def selected_rgba(self):
+        if hexa_color := self.app.selected_color():
+            rgb = [int(n, 16) / 255 for n in wrap(hexa_color[1:], 2)]
+            return (*rgb, 1)
+
+        return None
+
+    def change_color(self, m_pos):
+        result = self.pick(m_pos)
 
         if result.hasHit():
-            if hexa_color := self.app.selected_color():
-                node = result.getNode()
-                rgb = [int(n, 16) / 255 for n in wrap(hexa_color[1:], 2)]
-                color = LColor(*rgb, 1)
-                self.polh.change_face_color(node.getName(), color)
+            if color := self.selected_rgba():
+                face_num = result.getNode().getPythonTag('face')
+                self.polh.change_face_color(face_num, color)
 
-    def show_coloring_pic(self, name):
-        self.polh.clear()
-        vertices = get_vertices(name)
-        vertices = [Vec3(vertex) for vertex in vertices]
-        faces = get_faces(name)
-        uv = [vertex for vertex in self.polh.calc_uv(vertices)]
+    def fill_same_faces(self):
+        """Color every face having as many vertices as the face under the mouse.
+        """
+        if self.paint_mode or not self.mouseWatcherNode.hasMouse():
+            return
+
+        result = self.pick(self.mouseWatcherNode.getMouse())
 
-        li = [len(item) for item in faces]
-        dic = {item: i for i, item in enumerate(set(li))}
-        color_pattern = [dic[item] for item in li]
+        if result.hasHit() and (color := self.selected_rgba()):
+            face_num = result.getNode().getPythonTag('face')
+            sizes = self.polh.model.face_sizes
+            faces = np.flatnonzero(sizes == sizes[face_num])
+            self.polh.change_colors(faces, color)
+
+    def undo(self):
+        self.polh.undo()
+
+    def redo(self):
+        self.polh.redo()
+
+    def paint(self, m_pos):
+        result = self.pick(m_pos)
+
+        if result.hasHit() and (color := self.selected_rgba()):
+            face_num = result.getNode().getPythonTag('face')
+            self.polh.paint(face_num, result.getHitPos(), color)
+        else:
+            self.polh.end_stroke()
 
-        for i, (f, p) in enumerate(zip(faces, color_pattern)):
-            face_vertices = [vertices[i] for i in f]
-            face_uv = [uv[i] for i in f]
-            self.polh.make_face(face_vertices, face_uv, i, self.polh.colors[p])
+    def toggle_paint(self, paint_mode):
+        self.paint_mode = paint_mode
+
+    def show_coloring_pic(self, name):
+        self.close_gallery()
+        self.polh.set_model(PolyhedronModel.from_db(name, self.polh.colors))
 
     def toggle_debug(self, outline=1):
         if outline:
@@ -135,22 +212,14 @@ class ColoringBoard(ShowBase):
         else:
             self.debug.hide()
 
-    def rotate(self, dt, m_pos):
-        vec = Vec3()
+    def rotate(self, m_pos):
+        """Turn the camera by the mouse movement accumulated since the last frame.
+        """
         delta_x = m_pos.x - self.clicked_pos.x
         delta_y = m_pos.y - self.clicked_pos.y
+        vec = Vec3(delta_x, 0, delta_y) * self.ROTATION_SPEED
 
-        if delta_x < 0:
-            vec.x -= 180
-        elif delta_x > 0:
-            vec.x += 180
-
-        if delta_y < 0:
-            vec.z -= 180
-        elif delta_y > 0:
-            vec.z += 180
-
-        self.camera_np.setHpr(self.camera_np.getHpr() + vec * dt)
+        self.camera_np.setHpr(self.camera_np.getHpr() + vec)
         self.clicked_pos.x = m_pos.x
         self.clicked_pos.y = m_pos.y
 
@@ -166,33 +235,113 @@ class ColoringBoard(ShowBase):
                     self.clicked_pos = Vec2(m_pos.x, m_pos.y)
                     self.state = Mouse.DRAG
                 case Mouse.RELEASE:
-                    if globalClock.getFrameCount() <= self.dragging:
+                    if self.paint_mode:
+                        self.polh.end_stroke()
+                    elif globalClock.getFrameCount() <= self.dragging:
                         self.change_color(m_pos)
                     self.dragging = 0
                     self.state = None
                 case Mouse.DRAG:
-                    if 0 < self.dragging < globalClock.getFrameCount():
-                        self.rotate(dt, m_pos)
+                    if self.paint_mode:
+                        self.paint(m_pos)
+                    elif 0 < self.dragging < globalClock.getFrameCount():
+                        self.rotate(m_pos)
 
+        self.polh.sync()
+        self.gallery.update(self.cam)
         self.world.doPhysics(dt)
         return task.cont
 
 
 class Face(NodePath):
+    """Collision body used only for picking and outlines; the face number
+       is kept in the 'face' python tag.
+    """
 
-    def __init__(self, name, geom_node):
-        super().__init__(BulletRigidBodyNode(name))
-        obj = self.attachNewNode(geom_node)
-        obj.setTwoSided(True)
+    def __init__(self, face_num, points):
+        super().__init__(BulletRigidBodyNode(f'face_{face_num}'))
+        self.setPythonTag('face', face_num)
         shape = BulletConvexHullShape()
-        shape.addGeom(geom_node.getGeom(0))
+
+        for pt in points:
+            shape.addPoint(Point3(*pt))
+
         self.node().addShape(shape)
         self.setCollideMask(BitMask32(1))
         self.setScale(1.5)
         self.setR(-30)
 
 
+class TextureBlitter:
+    """Update rectangles of a texture on the GPU only. Panda3D 1.10 sends the
+       whole texture again whenever its ram image is modified, so instead the
+       texture is the render target of an offscreen buffer, which draws a
+       staging texture holding just the rectangle over it without clearing.
+       The buffer renders one frame each time there is a rectangle.
+    """
+
+    def __init__(self, texture, sort=-10):
+        width, height = texture.getXSize(), texture.getYSize()
+        fb_props = FrameBufferProperties()
+        fb_props.setRgbaBits(8, 8, 8, 8)
+        self.buffer = base.graphicsEngine.makeOutput(
+            base.pipe, 'blitBuffer', sort, fb_props, WindowProperties.size(width, height),
+            GraphicsPipe.BFRefuseWindow, base.win.getGsg(), base.win)
+        self.buffer.addRenderTexture(texture, GraphicsOutput.RTMBindOrCopy, GraphicsOutput.RTPColor)
+        self.buffer.setClearColorActive(False)
+        self.buffer.setActive(False)
+
+        # one unit is one pixel, with the origin at the bottom left of the texture
+        scene = NodePath(PandaNode('blitScene'))
+        scene.setDepthTest(False)
+        scene.setDepthWrite(False)
+        lens = OrthographicLens()
+        lens.setFilmSize(width, height)
+        lens.setFilmOffset(width / 2, height / 2)
+        lens.setNearFar(-1, 1)
+        self.buffer.makeDisplayRegion().setCamera(scene.attachNewNode(Camera('blitCamera', lens)))
+
+        self.staging = Texture('staging')
+        self.staging.setMinfilter(SamplerState.FTNearest)
+        self.staging.setMagfilter(SamplerState.FTNearest)
+        card = CardMaker('staging')
+        card.setFrame(0, 1, 0, 1)
+        self.card = scene.attachNewNode(card.generate())
+        self.card.setTexture(self.staging)
+        self.pending = None
+
+    def blit(self, image, dirty):
+        """Draw the rectangle (x0, y0, x1, y1) of image, a uint8 array of shape
+           (height, width, 4) in RGBA and bottom row first, into the texture in
+           the next frame. Rectangles blitted before that frame are merged.
+        """
+        if self.buffer.isActive():
+            x0, y0, x1, y1 = self.pending
+            dirty = (min(x0, dirty[0]), min(y0, dirty[1]), max(x1, dirty[2]), max(y1, dirty[3]))
+
+        x0, y0, x1, y1 = self.pending = dirty
+        self.staging.setup2dTexture(x1 - x0, y1 - y0, Texture.TUnsignedByte, Texture.FRgba8)
+        self.staging.setRamImage(image[y0:y1, x0:x1, [2, 1, 0, 3]].tobytes())
+        self.card.setPos(x0, 0, y0)
+        self.card.setScale(x1 - x0, 1, y1 - y0)
+        self.buffer.setOneShot(True)
+        self.buffer.setActive(True)
+
+    def remove(self):
+        base.graphicsEngine.removeWindow(self.buffer)
+
+
 class Polyhedron(NodePath):
+    """Thin view of a PolyhedronModel. The model is the single source of truth;
+       changed ranges of face colors are copied into the vertex data by sync.
+    """
+
+    NUMERIC_TYPES = {
+        Geom.NTUint8: np.uint8,
+        Geom.NTUint16: np.uint16,
+        Geom.NTUint32: np.uint32,
+        Geom.NTFloat32: np.float32,
+    }
 
     def __init__(self, world):
         super().__init__(PandaNode('polyhedronRoot'))
@@ -200,6 +349,15 @@ class Polyhedron(NodePath):
         self.world = world
         self.colors = [m.value for m in Colors]
         self.polh_format = self.make_custom_format()
+        self.model = None
+        self.rows = None
+        self.mesh = None
+        self.canvas = None
+        self.texture = None
+        self.blitter = None
+        self.history = ColorHistory()
+        self.paint_stage = TextureStage('paint')
+        self.paint_stage.setMode(TextureStage.MDecal)
 
     def make_custom_format(self):
         array_format = GeomVertexArrayFormat()
@@ -211,6 +369,22 @@ class Polyhedron(NodePath):
         format_ = GeomVertexFormat.registerFormat(array_format)
         return format_
 
+    def make_dtype(self, array_format):
+        """Numpy structured dtype matching one row of a vertex array.
+        """
+        names, formats, offsets = [], [], []
+
+        for i in range(array_format.getNumColumns()):
+            column = array_format.getColumn(i)
+            names.append(column.getName().getName())
+            type_ = self.NUMERIC_TYPES[column.getNumericType()]
+            num = column.getNumComponents()
+            formats.append(type_ if num == 1 else (type_, num))
+            offsets.append(column.getStart())
+
+        return np.dtype(dict(
+            names=names, formats=formats, offsets=offsets, itemsize=array_format.getStride()))
+
     def get_vdata(self, node_path, modify=False):
         found = node_path.findAllMatches('**/+GeomNode').getPath(0)
         geom_node = found.node()
@@ -224,149 +398,149 @@ class Polyhedron(NodePath):
 
         return vdata
 
-    def calc_uv(self, vertices):
+    def read_rows(self, vdata):
+        """Rows of vdata in the layout of polh_format. A loaded model can
+           come back premunged into other arrays once there is a GSG.
         """
-        vertices: list of Vec3
+        array = vdata.convertTo(self.polh_format).getArray(0)
+        dtype = self.make_dtype(array.getArrayFormat())
+        return np.frombuffer(array.getHandle().getData(), dtype=dtype)
+
+    def make_rows(self, model):
+        rows = np.zeros(model.num_corners, dtype=self.make_dtype(self.polh_format.getArray(0)))
+        rows['vertex'] = model.corners
+        rows['color'] = model.corner_colors
+        rows['normal'] = model.normals
+        rows['texcoord'] = model.corner_uv
+        rows['face'] = model.corner_faces
+        return rows
+
+    def set_model(self, model):
+        self.clear()
+        self.history.clear()
+        self.model = model
+        self.rows = self.make_rows(model)
+        model.pop_dirty()
+
+        self.mesh = self.attachNewNode(self.assemble())
+        self.mesh.setTwoSided(True)
+        self.mesh.setScale(1.5)
+        self.mesh.setR(-30)
+
+        for i in range(model.num_faces):
+            face = Face(i, model.face(i))
+            face.reparentTo(self)
+            self.world.attachRigidBody(face.node())
+
+    def read_model(self, model):
+        rows = self.read_rows(self.get_vdata(model))
+        return PolyhedronModel.from_corners(
+            rows['vertex'], rows['face'], rows['color'], rows['texcoord'])
+
+    def read_canvas(self, model):
+        """Return a PaintCanvas of the painting on a loaded model, or None.
         """
-        bounds = Bounds(vertices)
-
-        for vertex in vertices:
-            nm = (vertex - bounds.center) / bounds.radius
-            phi = np.arctan2(nm.z, nm.x)
-            theta = np.arcsin(nm.y)
-            u = (phi + np.pi) / (2 * np.pi)
-            v = (theta + np.pi / 2) / np.pi
-            yield Vec2(u, v)
+        if (stage := model.findTextureStage('paint')) and \
+                (texture := model.findTexture(stage)) and texture.hasRamImage():
+            image = np.frombuffer(texture.getRamImageAs('RGBA'), dtype=np.uint8)
+            return PaintCanvas(
+                image=image.reshape(texture.getYSize(), texture.getXSize(), 4).copy())
 
     def disassemble(self, model):
-        vdata = self.get_vdata(model)
-        vertex_reader = GeomVertexReader(vdata, 'vertex')
-        face_reader = GeomVertexReader(vdata, 'face')
-        color_reader = GeomVertexReader(vdata, 'color')
-        texcoord_reader = GeomVertexReader(vdata, 'texcoord')
-
-        face_dic = defaultdict(list)
-        texcoord_dic = defaultdict(list)
-        color_dic = dict()
-
-        while not vertex_reader.isAtEnd():
-            vertex = vertex_reader.getData3()
-            color = color_reader.getData4()
-            face_num = face_reader.getData1i()
-            texcoord = texcoord_reader.getData2f()
-
-            face_dic[face_num].append(vertex)
-            texcoord_dic[face_num].append(texcoord)
-            if face_num not in color_dic:
-                color_dic[face_num] = LColor(color)
-
-        for key, face_vertices in face_dic.items():
-            self.make_face(face_vertices, texcoord_dic[key], key, color_dic[key])
-
-    def make_face(self, face_vertices, texcoords, face_num, color):
-        geom_node = self.make_geomnode(face_vertices, texcoords, face_num, color)
-        face = Face(f'face_{face_num}', geom_node)
-        face.reparentTo(self)
-        self.world.attachRigidBody(face.node())
-
-    def triangle(self, start):
-        return (start, start + 1, start + 2)
-
-    def square(self, start):
-        for x, y, z in [(2, 1, 0), (0, 3, 2)]:
-            yield (start + x, start + y, start + z)
-
-    def polygon(self, start, vertices_num):
-        for i in range(2, vertices_num):
-            if i == 2:
-                yield (start, start + i - 1, start + i)
-            else:
-                yield (start + i - 1, start, start + i)
-
-    def prim_vertices(self, n, start):
-        match n:
-            case 3:
-                yield self.triangle(start)
-            case 4:
-                yield from self.square(start)
-            case _:
-                yield from self.polygon(start, n)
-
-    def make_geomnode(self, face_vertices, texcoords, face_num, rgba):
-        num_rows = len(face_vertices)
-        vdata = GeomVertexData('polyhedron', self.polh_format, Geom.UHStatic)
-        vdata.setNumRows(num_rows)
-        vertex = GeomVertexWriter(vdata, 'vertex')
-        normal = GeomVertexWriter(vdata, 'normal')
-        color = GeomVertexWriter(vdata, 'color')
-        texcoord = GeomVertexWriter(vdata, 'texcoord')
-        face = GeomVertexWriter(vdata, 'face')
-
-        for pt, uv in zip(face_vertices, texcoords):
-            vertex.addData3(pt)
-            normal.addData3(pt.normalized())
-            color.addData4f(rgba)
-            texcoord.addData2f(uv)
-            face.add_data1i(face_num)
+        self.set_model(self.read_model(model))
 
-        node = GeomNode('geomnode')
-        prim = GeomTriangles(Geom.UHStatic)
+        if (canvas := self.read_canvas(model)) is not None:
+            self.set_canvas(canvas)
 
-        for vertices in self.prim_vertices(num_rows, 0):
-            prim.addVertices(*vertices)
+    def make_texture(self, canvas, ram_image=True):
+        """Create a texture showing the canvas, which is transparent
+           where nothing was painted so that the face colors show through.
+        """
+        texture = Texture('paint')
+        texture.setup2dTexture(
+            canvas.width, canvas.height, Texture.TUnsignedByte, Texture.FRgba8)
+        texture.setMinfilter(SamplerState.FTLinear)
+        texture.setMagfilter(SamplerState.FTLinear)
 
-        geom = Geom(vdata)
-        geom.addPrimitive(prim)
-        node.addGeom(geom)
+        if ram_image:
+            texture.setRamImage(canvas.image[..., [2, 1, 0, 3]].tobytes())
 
-        return node
+        return texture
 
-    def change_face_color(self, node_name, color):
-        i = int(node_name.split('_')[1])
-        face = self.getChild(i)
-        vdata = self.get_vdata(face, modify=True)
-        color_writer = GeomVertexWriter(vdata, 'color')
+    def set_canvas(self, canvas, blit=True):
+        """Paint on canvas. With a window, its texture is updated on the GPU
+           a dirty rectangle at a time, unless blit is False; otherwise the
+           ram image is updated and the whole texture uploaded again.
+        """
+        self.remove_canvas()
+        self.canvas = canvas
 
-        while not color_writer.isAtEnd():
-            color_writer.setData4f(color)
+        # the software renderer takes only power of 2 textures, which dirty
+        # rectangles seldom are, and draws the card half a pixel off
+        blit = blit and base.win is not None and base.win.getGsg().getSupportsTexNonPow2()
+        self.texture = self.make_texture(canvas, ram_image=not blit)
 
-    def clear(self):
-        for face in self.getChildren():
-            self.world.remove(face.node())
-            face.removeNode()
+        if blit:
+            self.blitter = TextureBlitter(self.texture)
+            self.blitter.blit(canvas.image, (0, 0, canvas.width, canvas.height))
 
-    def assemble(self):
-        """Connect faces into one polyhedron.
+        self.apply_texture(self.mesh)
+
+    def remove_canvas(self):
+        if self.blitter is not None:
+            self.blitter.remove()
+
+        self.canvas = None
+        self.texture = None
+        self.blitter = None
+
+    def apply_texture(self, node_path):
+        if self.texture is not None:
+            node_path.setTexture(self.paint_stage, self.texture)
+
+    def save_texture(self, node_path, filepath):
+        """Write the canvas to a png file next to the bam file at filepath and
+           apply it to node_path, so that the bam file refers to the png
+           instead of embedding the uncompressed image.
         """
+        if self.canvas is None:
+            return
+
+        path = Filename.fromOsSpecific(str(filepath.with_suffix('.png')))
+        texture = self.make_texture(self.canvas)
+        texture.write(path)
+        texture.setFilename(path)
+        texture.setFullpath(path)
+        node_path.setTexture(self.paint_stage, texture)
+
+        # loading the bam file again must not find an older png in the pool
+        for cached in TexturePool.findAllTextures():
+            if cached.getFullpath() == path:
+                TexturePool.releaseTexture(cached)
+
+    def paint(self, face_num, hit_pos, color):
+        """Paint a stroke to the uv at hit_pos, a point in render space.
+        """
+        if self.canvas is None:
+            self.set_canvas(PaintCanvas())
+
+        point = self.mesh.getRelativePoint(base.render, hit_pos)
+        self.canvas.stroke_to(self.model.uv_at(face_num, point), color)
+
+    def end_stroke(self):
+        if self.canvas is not None:
+            self.canvas.end_stroke()
+
+    def make_geomnode(self, rows, triangles):
         vdata = GeomVertexData('polyhedron', self.polh_format, Geom.UHStatic)
-        vertex_writer = GeomVertexWriter(vdata, 'vertex')
-        normal_writer = GeomVertexWriter(vdata, 'normal')
-        color_writer = GeomVertexWriter(vdata, 'color')
-        texcoord_writer = GeomVertexWriter(vdata, 'texcoord')
-        face_writer = GeomVertexWriter(vdata, 'face')
+        vdata.setNumRows(len(rows))
+        vdata.modifyArray(0).modifyHandle().setData(rows.tobytes())
 
         prim = GeomTriangles(Geom.UHStatic)
-        start = 0
-
-        for child in self.getChildren():
-            child_vdata = self.get_vdata(child)
-            vertex_reader = GeomVertexReader(child_vdata, 'vertex')
-            normal_reader = GeomVertexReader(child_vdata, 'normal')
-            color_reader = GeomVertexReader(child_vdata, 'color')
-            texcoord_reader = GeomVertexReader(child_vdata, 'texcoord')
-            face_reader = GeomVertexReader(child_vdata, 'face')
-
-            while not vertex_reader.isAtEnd():
-                vertex_writer.addData3(vertex_reader.getData3())
-                normal_writer.addData3(normal_reader.getData3())
-                face_writer.addData1i(face_reader.getData1i())
-                color_writer.addData4f(color_reader.getData4f())
-                texcoord_writer.addData2f(texcoord_reader.getData2f())
-
-            n = child_vdata.getNumRows()
-            for vertices in self.prim_vertices(n, start):
-                prim.addVertices(*vertices)
-            start += n
+        prim.setIndexType(Geom.NTUint32)
+        indices = prim.modifyVertices()
+        indices.setNumRows(triangles.size)
+        indices.modifyHandle().setData(triangles.astype(np.uint32).tobytes())
 
         node = GeomNode('geomnode')
         geom = Geom(vdata)
@@ -375,7 +549,87 @@ class Polyhedron(NodePath):
 
         return node
 
+    def change_face_color(self, face_num, color):
+        before = self.model.colors[face_num].copy()
+        self.model.set_face_color(face_num, color)
+        self.history.record(face_num, before, self.model.colors[face_num])
+
+    def change_colors(self, faces, color):
+        """Color faces at once; they are undone together.
+        """
+        before = self.model.colors[faces]
+        self.model.set_colors(faces, color)
+        self.history.record(faces, before, self.model.colors[faces])
+
+    def undo(self):
+        if self.model is not None:
+            self.history.undo(self.model)
+
+    def redo(self):
+        if self.model is not None:
+            self.history.redo(self.model)
+
+    def sync(self):
+        self.sync_colors()
+        self.sync_texture()
+
+    def sync_texture(self):
+        """Send the dirty rectangle of the canvas to the texture, through the
+           blitter if there is one, or else by copying it into the ram image.
+        """
+        if self.canvas is None or (dirty := self.canvas.pop_dirty()) is None:
+            return
+
+        if self.blitter is not None:
+            self.blitter.blit(self.canvas.image, dirty)
+            return
+
+        x0, y0, x1, y1 = dirty
+        ram = np.frombuffer(self.texture.modifyRamImage(), dtype=np.uint8)
+        ram = ram.reshape(self.canvas.height, self.canvas.width, 4)
+        ram[y0:y1, x0:x1] = self.canvas.image[y0:y1, x0:x1, [2, 1, 0, 3]]
+
+    def sync_colors(self):
+        """Copy the dirty range of the model colors into the vertex data.
+        """
+        if self.model is None or (dirty := self.model.pop_dirty()) is None:
+            return
+
+        start, stop = self.model.face_offsets[list(dirty)]
+        self.rows['color'][start:stop] = self.model.colors[self.model.corner_faces[start:stop]]
+        stride = self.rows.dtype.itemsize
+        vdata = self.mesh.node().modifyGeom(0).modifyVertexData()
+        vdata.modifyArray(0).modifyHandle().setSubdata(
+            start * stride, (stop - start) * stride, self.rows[start:stop].tobytes())
+
+    def clear(self):
+        for face in self.getChildren():
+            if isinstance(face.node(), BulletRigidBodyNode):
+                self.world.remove(face.node())
+            face.removeNode()
+
+        self.model = None
+        self.rows = None
+        self.mesh = None
+        self.remove_canvas()
+
+    def assemble(self):
+        """Connect faces into one polyhedron.
+        """
+        self.sync()
+        return self.make_geomnode(self.rows, self.model.triangles)
+
 
 if __name__ == '__main__':
-    app = ColoringBoard()
-    app.run()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--stats', type=float, metavar='SECONDS',
+        help='print event counts per second and input latency at this interval')
+    parser.add_argument(
+        '--legacy-loop', action='store_true',
+        help='run the stock Tk main loop of ShowBase without coalescing, for comparison')
+    args = parser.parse_args()
+
+    app = ColoringBoard(legacy_loop=args.legacy_loop, stats_interval=args.stats)
+    app.run()
+    app.tkRoot.destroy()
\ No newline at end of file
@@ -40,6 +40,38 @@ def get_sub_items(prefix):
     return names
 
 
+def get_polyhedron(name):
+    """Return the vertices, faces and (key, version, geometry, dtype, shape, data)
+       rows of the precomputed derived arrays of the polyhedron through one
+       connection; the rows are empty if they were never stored.
+    """
+    with closing(sqlite3.connect(DB_NAME, detect_types=sqlite3.PARSE_DECLTYPES)) as conn:
+        vertices = [r[0] for r in conn.execute(SELECT_VERTEX, (name,))]
+        faces = [r[0] for r in conn.execute(SELECT_FACE, (name,))]
+
+        try:
+            rows = conn.execute(SELECT_DERIVED, (name,)).fetchall()
+        except sqlite3.OperationalError:
+            rows = []
+
+    return vertices, faces, rows
+
+
+def save_derived(name, version, geometry, arrays):
+    """geometry: hash of the geometry the arrays were computed from
+       arrays: list of (key, dtype, shape, data)
+    """
+    with closing(sqlite3.connect(DB_NAME)) as conn:
+        conn.execute(PRAGMA_FOREIGN_KEY)
+        conn.execute(CREATE_DERIVED_TABLE)
+        id_ = conn.execute(SELECT_ID, (name,)).fetchone()[0]
+        conn.execute(DELETE_DERIVED, (id_,))
+        conn.executemany(
+            INSERT_DERIVED,
+            [(id_, key, version, geometry, dtype, shape, data) for key, dtype, shape, data in arrays])
+        conn.commit()
+
+
 def insert_data(sql, data):
     with closing(sqlite3.connect(DB_NAME)) as conn:
         conn.execute(PRAGMA_FOREIGN_KEY)
@@ -52,7 +84,7 @@ def create_tables():
         conn.execute(PRAGMA_FOREIGN_KEY)
 
         for sql in (CREATE_POLYHEDRONS_TABLE, CREATE_VERTICES_TABLE,
-                    CREATE_FACES_TABLE, CREATE_ITEMS_TABLE):
+                    CREATE_FACES_TABLE, CREATE_ITEMS_TABLE, CREATE_DERIVED_TABLE):
             conn.execute(sql)
         conn.commit()
 
@@ -82,6 +114,22 @@ SELECT_SUB_ITEMS = '''
     WHERE id like ?
 '''
 
+SELECT_ID = '''
+    SELECT id FROM polyhedrons
+    WHERE name = ?
+'''
+
+SELECT_DERIVED = '''
+    SELECT key, version, geometry, dtype, shape, data
+    FROM derived as d
+    INNER JOIN polyhedrons AS p ON d.id = p.id
+    WHERE p.name = ?;
+'''
+
+DELETE_DERIVED = '''
+    DELETE FROM derived WHERE id = ?
+'''
+
 PRAGMA_FOREIGN_KEY = '''
     PRAGMA foreign_keys = 1
 '''
@@ -120,9 +168,26 @@ CREATE_FACES_TABLE = '''
     );
 '''
 
+CREATE_DERIVED_TABLE = '''
+    CREATE TABLE IF NOT EXISTS derived (
+        id TEXT,
+        key TEXT,
+        version INTEGER,
+        geometry TEXT,
+        dtype TEXT,
+        shape INTTUPLE,
+        data BLOB,
+        PRIMARY KEY(id, key),
+        FOREIGN KEY(id) REFERENCES polyhedrons(id)
+    );
+'''
+
 INSERT_POLYHEDRONS = 'INSERT INTO polyhedrons (id, name) VALUES (?, ?)'
 INSERT_VERTICES = 'INSERT INTO vertices (id, row_num, vertex) VALUES (?, ?, ?)'
 INSERT_FACES = 'INSERT INTO faces (id, row_num, face) VALUES (?, ?, ?)'
+INSERT_DERIVED = '''
+    INSERT INTO derived (id, key, version, geometry, dtype, shape, data) VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
 
 
 if __name__ == '__main__':
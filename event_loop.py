@@ -0,0 +1,257 @@
+import time
+import _tkinter
+
+from panda3d.core import GraphicsWindow
+
+
+# Tk events that are input from the user, unlike timers and redraws
+TK_INPUT_EVENTS = (
+    '<KeyPress>', '<KeyRelease>', '<ButtonPress>', '<ButtonRelease>', '<Motion>', '<MouseWheel>',
+)
+
+
+class Coalescer:
+    """Keep only the latest call posted for each key, and make the calls
+       once per frame when flushed.
+    """
+
+    __slots__ = ('pending', 'posted', 'applied')
+
+    def __init__(self):
+        self.pending = {}
+        self.posted = 0
+        self.applied = 0
+
+    def post(self, key, func, *args):
+        self.pending[key] = (func, args)
+        self.posted += 1
+
+    def flush(self):
+        pending, self.pending = self.pending, {}
+
+        for func, args in pending.values():
+            func(*args)
+
+        self.applied += len(pending)
+
+
+class EventStats:
+    """Count events per second and collect the time from the first input
+       of a frame to the end of rendering that frame.
+    """
+
+    __slots__ = (
+        'interval', 'started', 'frames', 'tk_events', 'inputs', 'latencies', 'coalescer', 'counts',
+    )
+
+    def __init__(self, coalescer, interval=5.0):
+        self.coalescer = coalescer
+        self.interval = interval
+        self.reset(time.perf_counter())
+
+    def reset(self, now):
+        self.started = now
+        self.frames = 0
+        self.tk_events = 0
+        self.inputs = 0
+        self.latencies = []
+        self.counts = (self.coalescer.posted, self.coalescer.applied)
+
+    def end_frame(self, input_since):
+        self.frames += 1
+        now = time.perf_counter()
+
+        if input_since is not None:
+            self.latencies.append(now - input_since)
+
+        if (elapsed := now - self.started) >= self.interval:
+            print(self.summary(elapsed))
+            self.reset(now)
+
+    def summary(self, elapsed):
+        posted = (self.coalescer.posted - self.counts[0]) / elapsed
+        applied = (self.coalescer.applied - self.counts[1]) / elapsed
+        text = (f'frames/s: {self.frames / elapsed:.1f}  tk events/s: {self.tk_events / elapsed:.1f}  '
+                f'input events/s: {self.inputs / elapsed:.1f}  '
+                f'posted/s: {posted:.1f}  applied/s: {applied:.1f}')
+
+        if self.latencies:
+            avg = sum(self.latencies) / len(self.latencies) * 1000
+            text += f'  latency avg: {avg:.1f} ms  max: {max(self.latencies) * 1000:.1f} ms'
+
+        return text
+
+
+class EventPump:
+    """Pump Tk events from a Panda3D task instead of the fixed rate timer of
+       ShowBase.startTk; needs tk-main-loop to be false before startTk.
+
+       While there was input within active_hold seconds, frames run at
+       frame_rate. Otherwise the pump waits up to idle_delay seconds for
+       input before the next frame. Either way it waits by blocking in Tk for
+       poll_interval at most and then looking at the Panda3D window, whose
+       input does not wake Tk; the frame limiter of ClockObject is not used
+       as it busy-waits.
+
+       Input is a Tk key, button, motion or wheel event, or a button event or
+       pointer motion in the Panda3D window; Tk timers and redraws are not.
+       Its time is when the pump last looked for input and found none, or
+       when Tk dispatched it while blocking, so the latency in the stats is
+       an upper bound of the time from the OS event to the rendered frame.
+
+       With legacy, the stock Tk main loop of ShowBase runs the frames, which
+       needs tk-main-loop to be true, and posted calls are made at once; the
+       pump only watches input for the stats.
+
+       userExit stops the main loop so that run returns, instead of raising
+       SystemExit, which a Tk callback run by dooneevent reports as a
+       background error and does not raise again.
+    """
+
+    def __init__(self, base, frame_rate=60, idle_delay=0.05, poll_interval=0.005,
+                 active_hold=1.0, legacy=False, stats_interval=None):
+        self.base = base
+        self.tk_root = base.tkRoot
+        self.idle_delay = idle_delay
+        self.poll_interval = poll_interval
+        self.active_hold = active_hold
+        self.legacy = legacy
+        self.frame_time = 1 / frame_rate
+        self.last_input = time.perf_counter()
+        self.last_poll = self.last_input
+        self.frame_start = self.last_input
+        self.input_since = None
+        self.pointer = None
+        self.waiting = False
+        self.timed_out = False
+        self.coalescer = Coalescer()
+        self.stats = None if stats_interval is None else EventStats(self.coalescer, stats_interval)
+
+        for sequence in TK_INPUT_EVENTS:
+            self.tk_root.bind_all(sequence, self.tk_input, add='+')
+
+        base.taskMgr.add(self.end_frame, 'tkPumpEndFrame', sort=60)
+        base.finalizeExit = self.stop
+
+        if legacy:
+            base.taskMgr.add(self.watch, 'tkPumpWatch', sort=-60)
+            return
+
+        base.taskMgr.remove('tkLoop')
+        base.taskMgr.add(self.pump, 'tkPump', sort=-60)
+
+    def post(self, key, func, *args):
+        """Call func with the latest args posted for key once in this frame.
+        """
+        self.coalescer.post(key, func, *args)
+
+        if self.legacy:
+            self.coalescer.flush()
+
+    def stop(self):
+        """Stop the main loop after this frame.
+        """
+        self.base.taskMgr.stop()
+
+        if self.legacy:
+            self.tk_root.quit()
+
+    def notify_input(self, since):
+        self.last_input = time.perf_counter()
+
+        if self.input_since is None or since < self.input_since:
+            self.input_since = since
+
+        if self.stats is not None:
+            self.stats.inputs += 1
+
+    def tk_input(self, event):
+        self.notify_input(time.perf_counter() if self.waiting else self.last_poll)
+
+    @property
+    def active(self):
+        return time.perf_counter() - self.last_input < self.active_hold
+
+    def window_input(self):
+        """Return True if the Panda3D window has button events waiting
+           or the pointer moved since the last call.
+        """
+        if not isinstance(win := self.base.win, GraphicsWindow):
+            return False
+
+        pointer = win.getPointer(0)
+        pos = (pointer.getX(), pointer.getY()) if pointer.getInWindow() else None
+        moved, self.pointer = pos != self.pointer, pos
+        return win.getInputDevice(0).hasButtonEvent() or moved
+
+    def poll(self, process_window=True):
+        """Look for input in the Panda3D window, after letting the window
+           read its pending OS events if process_window.
+        """
+        if process_window:
+            self.base.graphicsEngine.openWindows()
+
+        if self.window_input():
+            self.notify_input(self.last_poll)
+
+        self.last_poll = time.perf_counter()
+
+    def time_out(self):
+        self.timed_out = True
+
+    def wait(self, deadline, until_input):
+        """Handle Tk events until deadline, or until input if until_input.
+           Return the number of Tk events handled.
+        """
+        count = 0
+
+        while (now := time.perf_counter()) < deadline and \
+                not (until_input and self.input_since is not None):
+            self.timed_out = False
+            delay = max(int(min(self.poll_interval, deadline - now) * 1000), 1)
+            timer = self.tk_root.after(delay, self.time_out)
+            self.waiting = True
+            self.tk_root.dooneevent(_tkinter.ALL_EVENTS)
+            self.waiting = False
+
+            if not self.timed_out:
+                self.tk_root.after_cancel(timer)
+                count += 1
+
+            self.poll()
+
+        return count
+
+    def pump(self, task):
+        if self.active:
+            count = self.wait(self.frame_start + self.frame_time, False)
+        else:
+            count = self.wait(time.perf_counter() + self.idle_delay, True)
+
+        self.frame_start = time.perf_counter()
+
+        while self.tk_root.dooneevent(_tkinter.ALL_EVENTS | _tkinter.DONT_WAIT):
+            count += 1
+
+        self.poll()
+        self.coalescer.flush()
+
+        if self.stats is not None:
+            self.stats.tk_events += count
+
+        return task.cont
+
+    def watch(self, task):
+        """Only notice input for the stats; the stock loop handles Tk events.
+        """
+        self.poll(process_window=False)
+        return task.cont
+
+    def end_frame(self, task):
+        """Runs after the frame is rendered by igLoop.
+        """
+        if self.stats is not None:
+            self.stats.end_frame(self.input_since)
+
+        self.input_since = None
+        return task.cont
@@ -0,0 +1,311 @@
+import argparse
+import time
+
+from panda3d.core import loadPrcFileData
+from panda3d.core import PandaNode, NodePath, Texture, Shader, SamplerState
+from panda3d.core import GeomEnums, OmniBoundingVolume, Point3
+import numpy as np
+
+from db_manage import get_items, get_sub_items, get_vertices
+from polyhedron_model import PolyhedronModel
+
+
+GROUP_VERTEX = '''
+#version 140
+uniform mat4 p3d_ModelMatrix;
+uniform mat4 p3d_ViewMatrix;
+uniform mat4 p3d_ProjectionMatrix;
+uniform samplerBuffer instances;
+uniform sampler2D colors;
+in vec4 p3d_Vertex;
+in float face;
+out vec4 color;
+
+void main() {
+    // xyz: position in the gallery, w: row of the color table
+    vec4 inst = texelFetch(instances, gl_InstanceID);
+    vec4 world = p3d_ModelMatrix * p3d_Vertex + vec4(inst.xyz, 0);
+    gl_Position = p3d_ProjectionMatrix * p3d_ViewMatrix * world;
+    color = texelFetch(colors, ivec2(int(face + 0.5), int(inst.w + 0.5)), 0);
+}
+'''
+
+PROXY_VERTEX = '''
+#version 140
+uniform mat4 p3d_ViewMatrix;
+uniform mat4 p3d_ProjectionMatrix;
+uniform samplerBuffer instances;
+in vec4 p3d_Vertex;
+out vec4 color;
+
+void main() {
+    // two texels per instance: center and radius, then the flat color
+    vec4 inst = texelFetch(instances, gl_InstanceID * 2);
+    vec4 world = vec4(inst.xyz + p3d_Vertex.xyz * inst.w, 1);
+    gl_Position = p3d_ProjectionMatrix * p3d_ViewMatrix * world;
+    color = texelFetch(instances, gl_InstanceID * 2 + 1);
+}
+'''
+
+FRAGMENT = '''
+#version 140
+in vec4 color;
+out vec4 p3d_FragColor;
+
+void main() {
+    p3d_FragColor = color;
+}
+'''
+
+OCTAHEDRON_VERTICES = [(1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, 1), (0, 0, -1)]
+OCTAHEDRON_FACES = [
+    (0, 2, 4), (2, 1, 4), (1, 3, 4), (3, 0, 4),
+    (2, 0, 5), (1, 2, 5), (3, 1, 5), (0, 3, 5),
+]
+
+
+def grid_positions(count, spacing):
+    """Centered positions of a square grid on the plane facing the camera
+       (x is the depth axis of the board).
+    """
+    cols = int(np.ceil(np.sqrt(count)))
+    i = np.arange(count)
+    y = (i % cols - (cols - 1) / 2) * spacing
+    z = ((count - 1) // cols / 2 - i // cols) * spacing
+    return np.stack([np.zeros(count), y, z], axis=1).astype(np.float32)
+
+
+def frustum_planes(view_proj):
+    """Planes (a, b, c, d) of the view frustum, facing inward, from a
+       view-projection matrix in Panda3D's row-vector convention.
+    """
+    c = view_proj.T
+    return np.stack([c[3] + c[0], c[3] - c[0], c[3] + c[1], c[3] - c[1], c[3] + c[2], c[3] - c[2]])
+
+
+def cull_spheres(centers, radii, planes):
+    """Return a mask of the spheres that are at least partly inside the planes.
+    """
+    dist = centers @ planes[:, :3].T + planes[:, 3]
+    return (dist >= -radii[:, None] * np.linalg.norm(planes[:, :3], axis=1)).all(axis=1)
+
+
+def to_array(mat):
+    return np.array([list(mat.getRow(i)) for i in range(4)], dtype=np.float32)
+
+
+def buffer_texture(name, texels):
+    texture = Texture(name)
+    texture.setupBufferTexture(
+        max(len(texels), 1), Texture.TFloat, Texture.FRgba32, GeomEnums.UHDynamic)
+    return texture
+
+
+class GalleryGroup:
+    """Members with the same geometry, drawn as instances of one GeomNode.
+    """
+
+    __slots__ = ('node', 'members', 'instances', 'colors', 'visible')
+
+    def __init__(self, node, members, models):
+        self.node = node
+        self.members = np.asarray(members)
+        self.visible = None
+        self.instances = buffer_texture('instances', members)
+
+        # one row of face colors per member, in the BGRA order of ram images
+        table = np.stack([model.colors for model in models])
+        table = (table * 255).round().astype(np.uint8)[..., [2, 1, 0, 3]]
+        self.colors = Texture('colors')
+        self.colors.setup2dTexture(
+            table.shape[1], table.shape[0], Texture.TUnsignedByte, Texture.FRgba8)
+        self.colors.setMinfilter(SamplerState.FTNearest)
+        self.colors.setMagfilter(SamplerState.FTNearest)
+        self.colors.setRamImage(table.tobytes())
+
+        node.setShaderInput('instances', self.instances)
+        node.setShaderInput('colors', self.colors)
+
+
+class Gallery(NodePath):
+    """Show many polyhedrons at once. Members sharing geometry are drawn with
+       hardware instancing from one vertex data, each with its own row of a
+       face color table. Instances outside the camera frustum are culled on
+       the CPU every frame, and the ones whose radius is smaller than lod_size
+       times their distance from the camera are drawn as flat colored
+       octahedrons. Needs GLSL 1.40.
+    """
+
+    def __init__(self, polh, lod_size=0.02):
+        super().__init__(PandaNode('galleryRoot'))
+        self.reparentTo(base.render)
+        self.polh = polh
+        self.lod_size = lod_size
+        self.group_shader = Shader.make(Shader.SL_GLSL, vertex=GROUP_VERTEX, fragment=FRAGMENT)
+        self.proxy_shader = Shader.make(Shader.SL_GLSL, vertex=PROXY_VERTEX, fragment=FRAGMENT)
+        self.groups = []
+        self.proxy = None
+        self.clear()
+
+    @property
+    def active(self):
+        return bool(self.groups)
+
+    def make_instanced(self, model, shader):
+        rows = self.polh.make_rows(model)
+        node_path = self.attachNewNode(self.polh.make_geomnode(rows, model.triangles))
+        node_path.node().setBounds(OmniBoundingVolume())
+        node_path.node().setFinal(True)
+        node_path.setTwoSided(True)
+        node_path.setShader(shader)
+        # an instance count of 0 turns instancing off and draws one copy
+        # at the origin, so the node is hidden until it has instances
+        node_path.hide()
+        return node_path
+
+    def set_models(self, models):
+        """Lay out the models on a grid and return the size of the grid.
+        """
+        self.clear()
+        count = len(models)
+        spacing = max(model.radius for model in models) * 1.5 * 2.5
+        self.offsets = grid_positions(count, spacing)
+
+        groups = {}
+        for i, model in enumerate(models):
+            groups.setdefault(model.geometry_hash(), []).append(i)
+
+        self.centers = np.empty((count, 3), dtype=np.float32)
+        self.radii = np.empty(count, dtype=np.float32)
+        self.flat_colors = np.empty((count, 4), dtype=np.float32)
+        self.table_rows = np.empty(count, dtype=np.float32)
+
+        for members in groups.values():
+            node_path = self.make_instanced(models[members[0]], self.group_shader)
+            node_path.setScale(1.5)
+            node_path.setR(-30)
+            mat = node_path.getMat()
+
+            for row, i in enumerate(members):
+                model = models[i]
+                self.centers[i] = self.offsets[i] + np.array(mat.xformPoint(Point3(*model.center)))
+                self.radii[i] = model.radius * 1.5
+                self.flat_colors[i] = model.colors.mean(axis=0)
+                self.table_rows[i] = row
+
+            self.groups.append(GalleryGroup(node_path, members, [models[i] for i in members]))
+
+        proxy_model = PolyhedronModel.from_faces(OCTAHEDRON_VERTICES, OCTAHEDRON_FACES)
+        self.proxy = self.make_instanced(proxy_model, self.proxy_shader)
+        self.proxy_instances = buffer_texture('proxies', np.empty(count * 2))
+        self.proxy.setShaderInput('instances', self.proxy_instances)
+        self.proxy_visible = None
+
+        return np.ptp(self.offsets, axis=0).max() + spacing
+
+    def upload(self, node_path, texture, texels, count):
+        # the ram image must fill the whole buffer
+        data = np.zeros((texture.getXSize(), 4), dtype=np.float32)
+        data[:len(texels)] = texels
+        texture.setRamImage(data.tobytes())
+
+        if count:
+            node_path.setInstanceCount(count)
+            node_path.show()
+        else:
+            node_path.hide()
+
+    def update(self, cam):
+        """Cull the instances against the frustum of cam and choose their level
+           of detail; upload the instance lists only when they changed.
+        """
+        if not self.active:
+            return
+
+        lens = cam.node().getLens()
+        view = np.linalg.inv(to_array(cam.getMat(base.render)))
+        planes = frustum_planes(view @ to_array(lens.getProjectionMat()))
+        visible = cull_spheres(self.centers, self.radii, planes)
+
+        cam_pos = np.array(cam.getPos(base.render))
+        near = self.radii > np.linalg.norm(self.centers - cam_pos, axis=1) * self.lod_size
+
+        for group in self.groups:
+            members = group.members[(visible & near)[group.members]]
+            if group.visible is None or not np.array_equal(members, group.visible):
+                texels = np.column_stack([self.offsets[members], self.table_rows[members]])
+                self.upload(group.node, group.instances, texels, len(members))
+                group.visible = members
+
+        far = np.flatnonzero(visible & ~near)
+        if self.proxy_visible is None or not np.array_equal(far, self.proxy_visible):
+            texels = np.empty((len(far) * 2, 4), dtype=np.float32)
+            texels[0::2, :3] = self.centers[far]
+            texels[0::2, 3] = self.radii[far]
+            texels[1::2] = self.flat_colors[far]
+            self.upload(self.proxy, self.proxy_instances, texels, len(far))
+            self.proxy_visible = far
+
+    @property
+    def nbytes(self):
+        """Memory used by the per-instance arrays and color tables.
+        """
+        arrays = (self.offsets, self.centers, self.radii, self.flat_colors, self.table_rows)
+        tables = sum(group.colors.getRamImageSize() for group in self.groups)
+        return sum(array.nbytes for array in arrays) + tables
+
+    def clear(self):
+        for child in self.getChildren():
+            child.removeNode()
+
+        self.groups = []
+        self.proxy = None
+        self.offsets = np.empty((0, 3), dtype=np.float32)
+        self.centers = np.empty((0, 3), dtype=np.float32)
+        self.radii = np.empty(0, dtype=np.float32)
+        self.flat_colors = np.empty((0, 4), dtype=np.float32)
+        self.table_rows = np.empty(0, dtype=np.float32)
+
+
+def benchmark(models, size, frames):
+    from renderer import OffscreenRenderer
+
+    renderer = OffscreenRenderer(size)
+    gallery = Gallery(renderer.polh)
+    grid = gallery.set_models(models)
+    renderer.base.camera.setX(max(15, grid * 1.5))
+
+    for zoom in (1, 0.2):
+        renderer.base.camera.setX(renderer.base.camera.getX() * zoom)
+        start = time.perf_counter()
+
+        for i in range(frames):
+            renderer.camera_np.setH(360 * i / frames)
+            gallery.update(renderer.base.cam)
+            renderer.base.graphicsEngine.renderFrame()
+
+        elapsed = time.perf_counter() - start
+        detailed = sum(len(group.visible) for group in gallery.groups)
+        print(f'{len(models)} models, {len(gallery.groups)} geometries, zoom {zoom}: '
+              f'{frames / elapsed:.1f} frames/sec, last frame {detailed} detailed + '
+              f'{len(gallery.proxy_visible)} flat, {gallery.nbytes / 1024:.1f} KB of instance data')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('category', nargs='?', help='name of a category; all if omitted')
+    parser.add_argument('--repeat', type=int, default=1, help='times to repeat every member')
+    parser.add_argument('--size', type=int, default=512, help='width and height of the buffer')
+    parser.add_argument('--frames', type=int, default=120)
+    parser.add_argument('--headless', action='store_true', help='render with EGL without a display')
+    args = parser.parse_args()
+
+    if args.headless:
+        loadPrcFileData('', 'load-display p3headlessgl')
+
+    from coloring_board import Colors
+    palette = [color.value for color in Colors]
+    prefix = get_items()[args.category] if args.category else ''
+    names = [name for name in get_sub_items(prefix) if get_vertices(name)]
+    models = [PolyhedronModel.from_db(name, palette) for name in names] * args.repeat
+    benchmark(models, args.size, args.frames)
@@ -0,0 +1,180 @@
+import argparse
+import time
+
+import numpy as np
+
+
+def pack_colors(colors):
+    """Pack float RGBA colors of shape (n, 4) into uint32 values.
+    """
+    rgba = np.round(np.clip(colors, 0, 1) * 255).astype(np.uint8).reshape(-1, 4)
+    return rgba.view('<u4').ravel()
+
+
+def unpack_colors(packed):
+    """Unpack uint32 values into float RGBA colors of shape (n, 4).
+    """
+    rgba = np.ascontiguousarray(packed, dtype='<u4').view(np.uint8).reshape(-1, 4)
+    return rgba.astype(np.float32) / 255
+
+
+class ColorHistory:
+    """Undo and redo of face colors, kept as compact records in a ring buffer.
+
+       Each record holds a group number, a face number and the packed colors
+       before and after the change. Records recorded together share a group
+       and are undone together. Positions are absolute counters; the oldest
+       groups are dropped when the buffer is full.
+    """
+
+    RECORD = np.dtype([('group', '<u4'), ('face', '<u4'), ('before', '<u4'), ('after', '<u4')])
+
+    __slots__ = ('records', 'first', 'cursor', 'end', 'next_group')
+
+    def __init__(self, max_bytes=16 * 1024 ** 2):
+        self.records = np.zeros(max(max_bytes // self.RECORD.itemsize, 1), dtype=self.RECORD)
+        self.clear()
+
+    @property
+    def capacity(self):
+        return len(self.records)
+
+    @property
+    def nbytes(self):
+        return self.records.nbytes
+
+    @property
+    def can_undo(self):
+        return self.cursor > self.first
+
+    @property
+    def can_redo(self):
+        return self.cursor < self.end
+
+    def clear(self):
+        self.first = 0
+        self.cursor = 0
+        self.end = 0
+        self.next_group = 0
+
+    def positions(self, start, stop):
+        return np.arange(start, stop) % self.capacity
+
+    def find_boundary(self, pos, step):
+        """Return the position where the group of the record at pos begins
+           (step=-1) or ends (step=1), searching in growing chunks so that
+           the cost is proportional to the size of the group.
+        """
+        group = self.records['group'][pos % self.capacity]
+        limit = self.first if step < 0 else self.end
+        chunk = 16
+
+        while True:
+            if step < 0:
+                start = max(pos - chunk, limit)
+                groups = self.records['group'][self.positions(start, pos)]
+                if (differ := np.flatnonzero(groups != group)).size:
+                    return start + differ[-1] + 1
+                if start == limit:
+                    return limit
+                pos = start
+            else:
+                stop = min(pos + chunk, limit)
+                groups = self.records['group'][self.positions(pos, stop)]
+                if (differ := np.flatnonzero(groups != group)).size:
+                    return pos + differ[0]
+                if stop == limit:
+                    return limit
+                pos = stop
+            chunk *= 2
+
+    def record(self, faces, before, after):
+        """Record one change of the colors of faces as one group and return True.
+           A group larger than the whole buffer is not recorded and False is
+           returned; the history before it is kept, but the redo after it
+           is dropped as the change cannot be undone.
+           before, after: float RGBA colors of shape (len(faces), 4)
+        """
+        faces = np.atleast_1d(np.asarray(faces, dtype=np.uint32))
+        n = len(faces)
+        self.end = self.cursor
+
+        if n > self.capacity:
+            return False
+
+        while self.end + n - self.first > self.capacity:
+            self.first = self.find_boundary(self.first, 1)
+
+        idx = self.positions(self.end, self.end + n)
+        self.records['group'][idx] = self.next_group
+        self.records['face'][idx] = faces
+        self.records['before'][idx] = pack_colors(before)
+        self.records['after'][idx] = pack_colors(after)
+        self.next_group += 1
+        self.end += n
+        self.cursor = self.end
+        return True
+
+    def undo(self, model):
+        """Restore the colors before the last recorded group.
+           Return False if there is nothing to undo.
+        """
+        if not self.can_undo:
+            return False
+
+        start = self.find_boundary(self.cursor - 1, -1)
+        records = self.records[self.positions(start, self.cursor)][::-1]
+        model.set_colors(records['face'], unpack_colors(records['before']))
+        self.cursor = start
+        return True
+
+    def redo(self, model):
+        """Apply the colors after the next undone group again.
+           Return False if there is nothing to redo.
+        """
+        if not self.can_redo:
+            return False
+
+        stop = self.find_boundary(self.cursor, 1)
+        records = self.records[self.positions(self.cursor, stop)]
+        model.set_colors(records['face'], unpack_colors(records['after']))
+        self.cursor = stop
+        return True
+
+
+def benchmark(edits, max_bytes):
+    from polyhedron_model import PolyhedronModel, stored_polyhedrons
+
+    _, vertices, faces = next(stored_polyhedrons())
+    model = PolyhedronModel.from_faces(vertices, faces)
+    history = ColorHistory(max_bytes)
+    rng = np.random.default_rng(0)
+    face_nums = rng.integers(0, model.num_faces, edits)
+    colors = rng.random((edits, 4)).astype(np.float32)
+
+    start = time.perf_counter()
+    for face, color in zip(face_nums, colors):
+        before = model.colors[face].copy()
+        model.set_face_color(face, color)
+        history.record(face, before, color)
+    recorded = time.perf_counter() - start
+
+    start = time.perf_counter()
+    undone = 0
+    while undone < 1000 and history.undo(model):
+        undone += 1
+    while history.redo(model):
+        pass
+    elapsed = time.perf_counter() - start
+
+    print(f'{edits} edits recorded in {recorded:.3f} s, '
+          f'{history.end - history.first} kept in {history.nbytes / 1024 ** 2:.1f} MB; '
+          f'{undone} undo + redo in {elapsed * 1000:.3f} ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--edits', type=int, default=1_000_000, help='number of single face edits')
+    parser.add_argument('--max-bytes', type=int, default=16 * 1024 ** 2, help='memory cap of the history')
+    args = parser.parse_args()
+    benchmark(args.edits, args.max_bytes)
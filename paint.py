@@ -0,0 +1,141 @@
+import argparse
+import time
+
+import numpy as np
+
+
+class PaintCanvas:
+    """NumPy-backed RGBA image painted in uv space, independent of Panda3D.
+       Rows are stored bottom-up like Panda3D ram images, so that row y
+       corresponds to v = y / height. The area changed since the last
+       pop_dirty is tracked as one rectangle.
+    """
+
+    __slots__ = ('image', 'brush_radius', 'last_pos', '_dirty')
+
+    def __init__(self, size=4096, image=None, brush_radius=8):
+        """size: width and height in pixels of a new, transparent image
+           image: uint8 array of shape (height, width, 4) to paint on instead
+        """
+        if image is None:
+            image = np.zeros((size, size, 4), dtype=np.uint8)
+
+        self.image = image
+        self.brush_radius = brush_radius
+        self.last_pos = None
+        self._dirty = None
+
+    @property
+    def height(self):
+        return self.image.shape[0]
+
+    @property
+    def width(self):
+        return self.image.shape[1]
+
+    def to_pixel(self, uv):
+        u, v = uv
+        return np.array([u * self.width, v * self.height])
+
+    def stroke_to(self, uv, color):
+        """Paint a stroke from the last position to uv; a new stroke
+           starts with a dot. Strokes are not continued across the seam of
+           the spherical uv.
+           color: (r, g, b, a) of floats between 0 and 1
+        """
+        pos = self.to_pixel(uv)
+
+        if self.last_pos is None or abs(pos[0] - self.last_pos[0]) > self.width / 2:
+            start = pos
+        else:
+            start = self.last_pos
+
+        self.draw_capsule(start, pos, color)
+        self.last_pos = pos
+
+    def end_stroke(self):
+        self.last_pos = None
+
+    def draw_capsule(self, start, end, color):
+        """Fill every pixel within brush_radius of the segment from start to end.
+        """
+        r = self.brush_radius
+        x0, y0 = np.maximum(np.floor(np.minimum(start, end) - r), 0).astype(int)
+        x1 = int(min(np.ceil(max(start[0], end[0]) + r) + 1, self.width))
+        y1 = int(min(np.ceil(max(start[1], end[1]) + r) + 1, self.height))
+
+        if x0 >= x1 or y0 >= y1:
+            return
+
+        ys, xs = np.ogrid[y0:y1, x0:x1]
+        px = xs + 0.5 - start[0]
+        py = ys + 0.5 - start[1]
+        dx, dy = end - start
+
+        if length := dx ** 2 + dy ** 2:
+            t = np.clip((px * dx + py * dy) / length, 0, 1)
+        else:
+            t = 0
+
+        mask = (px - t * dx) ** 2 + (py - t * dy) ** 2 <= r ** 2
+        rgba = (np.asarray(color) * 255).round().astype(np.uint8)
+        self.image[y0:y1, x0:x1][mask] = rgba
+        self.mark_dirty(x0, y0, x1, y1)
+
+    def mark_dirty(self, x0, y0, x1, y1):
+        if self._dirty is not None:
+            dx0, dy0, dx1, dy1 = self._dirty
+            x0, y0, x1, y1 = min(x0, dx0), min(y0, dy0), max(x1, dx1), max(y1, dy1)
+        self._dirty = (x0, y0, x1, y1)
+
+    def pop_dirty(self):
+        """Return the changed rectangle as (x0, y0, x1, y1), or None if
+           nothing was painted since the last call.
+        """
+        dirty, self._dirty = self._dirty, None
+        return dirty
+
+
+def benchmark(size, frames):
+    """Paint a stroke for the given number of frames on a polyhedron rendered
+       offscreen, timing the texture update and the rendering of every frame,
+       first with the whole ram image uploaded again each frame and then
+       with only the dirty rectangles drawn into the texture on the GPU.
+    """
+    from renderer import OffscreenRenderer
+
+    renderer = OffscreenRenderer()
+    renderer.load('Cuboctahedron')
+    polh = renderer.polh
+    angles = np.linspace(0, 4 * np.pi, frames)
+    uvs = np.stack([0.5 + 0.3 * np.cos(angles), 0.5 + 0.3 * np.sin(angles)], axis=1)
+
+    for blit in (False, True):
+        polh.set_canvas(PaintCanvas(size), blit)
+        polh.sync()
+        renderer.base.graphicsEngine.renderFrame()
+        start = time.perf_counter()
+
+        for uv in uvs:
+            polh.canvas.stroke_to(uv, (1, 0, 0, 1))
+            polh.sync()
+            renderer.base.graphicsEngine.renderFrame()
+
+        elapsed = time.perf_counter() - start
+        print(f'{size}x{size} {"dirty rectangles" if blit else "whole texture"}: '
+              f'{frames} frames in {elapsed:.3f} s '
+              f'({elapsed / frames * 1000:.3f} ms/frame, {frames / elapsed:.0f} fps)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=4096, help='width and height of the texture')
+    parser.add_argument('--frames', type=int, default=600, help='number of frames to paint')
+    parser.add_argument('--headless', action='store_true', help='render with EGL without a display')
+    args = parser.parse_args()
+
+    if args.headless:
+        from panda3d.core import loadPrcFileData
+        loadPrcFileData('', 'load-display p3headlessgl')
+
+    benchmark(args.size, args.frames)
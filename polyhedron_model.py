@@ -0,0 +1,397 @@
+import argparse
+import hashlib
+import time
+
+import numpy as np
+
+from bounds import Bounds
+from db_manage import get_vertices, get_faces, get_sub_items, get_polyhedron, save_derived
+
+
+# Bump whenever a calc_* method changes so stored arrays are recomputed.
+DERIVED_VERSION = 1
+
+
+class PolyhedronModel:
+    """Structure-of-arrays state of one polyhedron, independent of Panda3D.
+
+       Faces are stored as offsets into a flat index array: the vertex
+       indices of face i are face_indices[face_offsets[i]:face_offsets[i + 1]].
+       Every position in face_indices is a 'corner', which becomes one row
+       of vertex data on the GPU.
+
+       Arrays listed in DERIVED only depend on the geometry; each is computed
+       by the calc_<key> method unless it is passed in precomputed.
+    """
+
+    DERIVED = (
+        'center', 'radius', 'uv', 'normals', 'triangle_faces', 'triangles',
+        'face_normals', 'adjacency',
+    )
+
+    __slots__ = (
+        'vertices', 'face_offsets', 'face_indices', 'colors', 'corner_faces',
+        *DERIVED, '_dirty_start', '_dirty_stop',
+    )
+
+    def __init__(self, vertices, face_offsets, face_indices, colors=None, derived=None):
+        """vertices: array-like of shape (n, 3)
+           face_offsets: array-like of shape (faces + 1,)
+           face_indices: array-like of vertex indices
+           colors: array-like of shape (faces, 4); white if omitted
+           derived: dict of precomputed arrays keyed by the names in DERIVED
+        """
+        self.vertices = np.ascontiguousarray(vertices, dtype=np.float32)
+        self.face_offsets = np.ascontiguousarray(face_offsets, dtype=np.int32)
+        self.face_indices = np.ascontiguousarray(face_indices, dtype=np.int32)
+
+        if colors is None:
+            self.colors = np.ones((self.num_faces, 4), dtype=np.float32)
+        else:
+            self.colors = np.ascontiguousarray(colors, dtype=np.float32)
+
+        self.corner_faces = np.repeat(
+            np.arange(self.num_faces, dtype=np.int32), self.face_sizes)
+        derived = derived or {}
+
+        for key in self.DERIVED:
+            if (value := derived.get(key)) is None:
+                value = getattr(self, f'calc_{key}')()
+            setattr(self, key, value)
+
+        self._dirty_start = 0
+        self._dirty_stop = self.num_faces
+
+    @classmethod
+    def from_faces(cls, vertices, faces, derived=None):
+        """vertices: list of (x, y, z)
+           faces: list of tuples of vertex indices
+           derived: dict of precomputed arrays, such as returned by load_derived
+        """
+        return cls(vertices, *flatten_faces(faces), derived=derived)
+
+    @classmethod
+    def from_db(cls, name, palette):
+        """Load a polyhedron from the database, using its precomputed derived
+           arrays if they were stored for the same geometry, and color it by
+           face size with palette.
+        """
+        vertices, faces, rows = get_polyhedron(name)
+        vertices = np.asarray(vertices, dtype=np.float32)
+        face_offsets, face_indices = flatten_faces(faces)
+        derived = load_derived(rows, digest((vertices, face_offsets, face_indices)))
+
+        model = cls(vertices, face_offsets, face_indices, derived=derived)
+        model.color_by_size(palette)
+        return model
+
+    @classmethod
+    def from_corners(cls, corners, face_nums, colors, uv):
+        """Rebuild a model from per-corner vertex data, such as a saved bam file.
+           A new face starts wherever the face number changes.
+           corners: array of shape (n, 3)
+           face_nums: array of shape (n,)
+           colors: array of shape (n, 4)
+           uv: array of shape (n, 2)
+        """
+        face_nums = np.asarray(face_nums)
+        starts = np.flatnonzero(np.diff(face_nums)) + 1
+        face_offsets = np.concatenate(([0], starts, [len(face_nums)]))
+        face_indices = np.arange(len(face_nums))
+        face_colors = np.asarray(colors)[face_offsets[:-1]]
+
+        return cls(corners, face_offsets, face_indices, face_colors, dict(uv=uv))
+
+    @property
+    def num_faces(self):
+        return len(self.face_offsets) - 1
+
+    @property
+    def num_corners(self):
+        return len(self.face_indices)
+
+    @property
+    def face_sizes(self):
+        return np.diff(self.face_offsets)
+
+    @property
+    def corners(self):
+        return self.vertices[self.face_indices]
+
+    @property
+    def next_corners(self):
+        """Index of the following corner around the same face.
+        """
+        following = np.arange(1, self.num_corners + 1)
+        following[self.face_offsets[1:] - 1] = self.face_offsets[:-1]
+        return following
+
+    @property
+    def corner_uv(self):
+        return self.uv[self.face_indices]
+
+    @property
+    def corner_colors(self):
+        return self.colors[self.corner_faces]
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self.__slots__
+                   if isinstance(getattr(self, name), np.ndarray))
+
+    @property
+    def bytes_per_face(self):
+        return self.nbytes / self.num_faces
+
+    def geometry_hash(self):
+        """Hex digest of the geometry; models with the same one can share vertex data.
+        """
+        return digest((self.vertices, self.face_offsets, self.face_indices))
+
+    def content_hash(self):
+        """Hex digest of the geometry and colors, which identify how the model looks.
+        """
+        return digest((self.vertices, self.face_offsets, self.face_indices, self.colors))
+
+    def face(self, i):
+        """Return the vertex positions of face i.
+        """
+        start, stop = self.face_offsets[i:i + 2]
+        return self.vertices[self.face_indices[start:stop]]
+
+    def uv_at(self, i, point):
+        """Interpolate the uv at a point on face i from the barycentric
+           coordinates of the triangle containing it.
+           point: (x, y, z) in model space
+        """
+        tris = self.triangles[self.triangle_faces == i]
+        a, b, c = (self.corners[tris[:, k]] for k in range(3))
+        v0, v1, v2 = b - a, c - a, np.asarray(point, dtype=np.float32) - a
+
+        d00 = np.einsum('ij,ij->i', v0, v0)
+        d01 = np.einsum('ij,ij->i', v0, v1)
+        d11 = np.einsum('ij,ij->i', v1, v1)
+        d20 = np.einsum('ij,ij->i', v2, v0)
+        d21 = np.einsum('ij,ij->i', v2, v1)
+        denom = d00 * d11 - d01 ** 2
+        wb = (d11 * d20 - d01 * d21) / denom
+        wc = (d00 * d21 - d01 * d20) / denom
+        weights = np.stack([1 - wb - wc, wb, wc], axis=1)
+
+        best = weights.min(axis=1).argmax()
+        return weights[best] @ self.corner_uv[tris[best]]
+
+    def calc_center(self):
+        return Bounds(self.vertices).center
+
+    def calc_radius(self):
+        return np.linalg.norm(self.vertices - self.center, axis=1).max()
+
+    def calc_uv(self):
+        """Spherical uv of each vertex around the center of the bounds.
+        """
+        nm = (self.vertices - self.center) / self.radius
+        phi = np.arctan2(nm[:, 2], nm[:, 0])
+        theta = np.arcsin(np.clip(nm[:, 1], -1, 1))
+        u = (phi + np.pi) / (2 * np.pi)
+        v = (theta + np.pi / 2) / np.pi
+
+        return np.stack([u, v], axis=1).astype(np.float32)
+
+    def calc_normals(self):
+        """Per-corner normals pointing away from the origin.
+        """
+        corners = self.corners
+        lengths = np.linalg.norm(corners, axis=1, keepdims=True)
+        return np.divide(corners, lengths, out=np.zeros_like(corners), where=lengths > 0)
+
+    def calc_triangle_faces(self):
+        return np.repeat(np.arange(self.num_faces, dtype=np.int32), self.face_sizes - 2)
+
+    def calc_triangles(self):
+        """Fan triangulation of every face in corner indices, wound the same
+           way as the original per-face triangle, square and polygon primitives.
+        """
+        tri_counts = self.face_sizes - 2
+        firsts = np.repeat(np.cumsum(tri_counts) - tri_counts, tri_counts)
+        i = np.arange(len(self.triangle_faces)) - firsts + 2
+        start = self.face_offsets[self.triangle_faces]
+        n = self.face_sizes[self.triangle_faces]
+
+        triangles = np.stack([start + i - 1, start, start + i], axis=1)
+        triangles[i == 2] = np.stack([start, start + 1, start + 2], axis=1)[i == 2]
+
+        quads = n == 4
+        quad_tris = np.where(
+            (i == 2)[:, None],
+            np.stack([start + 2, start + 1, start], axis=1),
+            np.stack([start, start + 3, start + 2], axis=1))
+        triangles[quads] = quad_tris[quads]
+
+        return triangles.astype(np.int32)
+
+    def calc_face_normals(self):
+        """Unit normal of each face by Newell's method, turned to point
+           away from the center.
+        """
+        corners = self.corners
+        starts = self.face_offsets[:-1]
+        cross = np.cross(corners, corners[self.next_corners])
+        normals = np.add.reduceat(cross, starts, axis=0)
+
+        centroids = np.add.reduceat(corners, starts, axis=0) / self.face_sizes[:, None]
+        flip = np.einsum('ij,ij->i', normals, centroids - self.center) < 0
+        normals[flip] *= -1
+        lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+
+        return np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+
+    def calc_adjacency(self):
+        """Pairs of faces sharing an edge, as an array of shape (edges, 2).
+        """
+        edges = np.sort(
+            np.stack([self.face_indices, self.face_indices[self.next_corners]], axis=1), axis=1)
+        order = np.lexsort((edges[:, 1], edges[:, 0]))
+        edges = edges[order]
+        faces = self.corner_faces[order]
+        shared = np.flatnonzero((edges[1:] == edges[:-1]).all(axis=1))
+
+        return np.stack([faces[shared], faces[shared + 1]], axis=1).astype(np.int32)
+
+    def store_derived(self, name):
+        """Save the derived arrays of the polyhedron to the database.
+        """
+        arrays = []
+
+        for key in self.DERIVED:
+            value = np.asarray(getattr(self, key))
+            arrays.append((key, value.dtype.str, value.shape, value.tobytes()))
+
+        save_derived(name, DERIVED_VERSION, self.geometry_hash(), arrays)
+
+    def color_by_size(self, palette):
+        """Give faces with the same number of vertices the same color.
+           palette: list of (r, g, b, a)
+        """
+        sizes = self.face_sizes.tolist()
+        dic = {item: i for i, item in enumerate(set(sizes))}
+        pattern = [dic[item] for item in sizes]
+        self.colors[:] = np.asarray(palette, dtype=np.float32)[pattern]
+        self.mark_dirty(0, self.num_faces)
+
+    def set_face_color(self, i, color):
+        self.colors[i] = color
+        self.mark_dirty(i, i + 1)
+
+    def set_colors(self, faces, colors):
+        """faces: array of face numbers
+           colors: array of shape (4,) or (len(faces), 4)
+        """
+        faces = np.asarray(faces, dtype=np.int32)
+        if faces.size:
+            self.colors[faces] = colors
+            self.mark_dirty(faces.min(), faces.max() + 1)
+
+    def mark_dirty(self, start, stop):
+        if self._dirty_start < self._dirty_stop:
+            start = min(start, self._dirty_start)
+            stop = max(stop, self._dirty_stop)
+        self._dirty_start = int(start)
+        self._dirty_stop = int(stop)
+
+    def pop_dirty(self):
+        """Return the dirty face range as (start, stop), or None if nothing
+           changed since the last call.
+        """
+        if self._dirty_start < self._dirty_stop:
+            dirty = (self._dirty_start, self._dirty_stop)
+            self._dirty_start = self._dirty_stop = 0
+            return dirty
+
+        return None
+
+
+def digest(arrays):
+    blake = hashlib.blake2b(digest_size=16)
+
+    for array in arrays:
+        blake.update(array.tobytes())
+
+    return blake.hexdigest()
+
+
+def flatten_faces(faces):
+    """Return the face offsets and face indices of a list of tuples of vertex indices.
+    """
+    sizes = [len(face) for face in faces]
+    face_offsets = np.zeros(len(faces) + 1, dtype=np.int32)
+    np.cumsum(sizes, out=face_offsets[1:])
+    face_indices = np.fromiter(
+        (i for face in faces for i in face), dtype=np.int32, count=face_offsets[-1])
+
+    return face_offsets, face_indices
+
+
+def load_derived(rows, geometry):
+    """Return the derived arrays in rows read by get_polyhedron, or None if
+       they are missing, were stored by another DERIVED_VERSION or were
+       computed from a geometry whose hash is not geometry.
+    """
+    keys = {key for key, *_ in rows}
+
+    if keys != set(PolyhedronModel.DERIVED) or \
+            any(row[1:3] != (DERIVED_VERSION, geometry) for row in rows):
+        return None
+
+    return {key: np.frombuffer(data, dtype=dtype).reshape(shape or ())
+            for key, _, _, dtype, shape, data in rows}
+
+
+def stored_polyhedrons():
+    """Yield (name, vertices, faces) of every polyhedron with geometry in the database.
+    """
+    for name in get_sub_items(''):
+        if (vertices := get_vertices(name)) and (faces := get_faces(name)):
+            yield name, vertices, faces
+
+
+def precompute():
+    for name, vertices, faces in stored_polyhedrons():
+        model = PolyhedronModel.from_faces(vertices, faces)
+        model.store_derived(name)
+        print(f'{name:<40} stored {model.nbytes} bytes')
+
+
+def benchmark():
+    for name, vertices, faces in stored_polyhedrons():
+        palette = [(1, 1, 1, 1)] * len(faces)
+
+        # both include reading the polyhedron from the database and coloring it
+        start = time.perf_counter()
+        vertices, faces, rows = get_polyhedron(name)
+        model = PolyhedronModel.from_faces(vertices, faces)
+        model.color_by_size(palette)
+        computed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        PolyhedronModel.from_db(name, palette)
+        loaded = time.perf_counter() - start
+        derived = load_derived(rows, model.geometry_hash())
+
+        print(f'{name:<40} faces: {model.num_faces:>4}  '
+              f'computed: {computed * 1000:7.3f} ms  '
+              f'precomputed: {"-" if derived is None else f"{loaded * 1000:.3f} ms":>9}  '
+              f'memory: {model.nbytes:>7} bytes ({model.bytes_per_face:.1f} bytes/face)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--precompute', action='store_true',
+        help='store the derived arrays of every polyhedron in the database')
+    args = parser.parse_args()
+
+    if args.precompute:
+        precompute()
+    else:
+        benchmark()
@@ -0,0 +1,190 @@
+import argparse
+import hashlib
+import struct
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from direct.showbase.ShowBase import ShowBase
+from panda3d.core import loadPrcFileData
+from panda3d.core import PandaNode, NodePath, Texture, GraphicsOutput
+from panda3d.bullet import BulletWorld
+import numpy as np
+
+from coloring_board import Polyhedron
+from db_manage import get_vertices, get_items, get_sub_items
+from polyhedron_model import PolyhedronModel
+
+
+CACHE_DIR = Path('thumbnails')
+
+
+def encode_png(rgba):
+    """Encode an image to png bytes. zlib releases the GIL while
+       compressing, so images can be encoded on worker threads.
+       rgba: uint8 array of shape (height, width, 4), top row first
+    """
+    height, width, _ = rgba.shape
+    rows = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    rows[:, 1:] = rgba.reshape(height, -1)
+
+    def chunk(tag, data):
+        body = tag + data
+        return struct.pack('>I', len(data)) + body + struct.pack('>I', zlib.crc32(body))
+
+    return b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)),
+        chunk(b'IDAT', zlib.compress(rows.tobytes(), 6)),
+        chunk(b'IEND', b''),
+    ])
+
+
+def write_png(path, bgra):
+    """bgra: uint8 array of shape (height, width, 4) as in a Panda3D ram image,
+       bottom row first
+    """
+    rgba = bgra[::-1, :, [2, 1, 0, 3]]
+    path.write_bytes(encode_png(rgba))
+    return path
+
+
+class OffscreenRenderer:
+    """Render polyhedrons into an offscreen buffer without opening a window.
+       Frames are copied into ram and encoded to png on a thread pool
+       while the next frame is rendered.
+    """
+
+    def __init__(self, size=256, software=False, workers=4):
+        loadPrcFileData('', f'win-size {size} {size}')
+        self.base = ShowBase(windowType='none')
+
+        # the module is named, as load-display only counts for the first pipe made
+        if software:
+            self.base.pipe = self.base.makeModulePipe('p3tinydisplay')
+        else:
+            self.base.makeDefaultPipe()
+
+        self.base.openMainWindow(type='offscreen')
+        self.size = size
+
+        self.camera_np = NodePath(PandaNode('cameraNode'))
+        self.camera_np.reparentTo(self.base.render)
+        self.base.camera.reparentTo(self.camera_np)
+        self.base.camera.setPos(15, 0, 0)
+        self.base.camera.lookAt(0, 0, 0)
+
+        self.polh = Polyhedron(BulletWorld())
+        self.frame = Texture('frame')
+        self.base.win.addRenderTexture(self.frame, GraphicsOutput.RTMCopyRam)
+        self.pool = ThreadPoolExecutor(workers)
+        self.rendered = 0
+        self.cache_hits = 0
+
+    def read(self, source):
+        """Return the PolyhedronModel and the PaintCanvas, or None if not painted,
+           of source without building the scene.
+           source: name of a polyhedron in the database, or path to a bam file
+        """
+        if Path(source).suffix == '.bam':
+            model = self.base.loader.loadModel(Path(source))
+            return self.polh.read_model(model), self.polh.read_canvas(model)
+
+        return PolyhedronModel.from_db(source, self.polh.colors), None
+
+    def show(self, model, canvas):
+        self.polh.set_model(model)
+
+        if canvas is not None:
+            self.polh.set_canvas(canvas)
+
+    def load(self, source):
+        self.show(*self.read(source))
+
+    def content_hash(self, model, canvas):
+        digest = hashlib.blake2b(model.content_hash().encode(), digest_size=16)
+        digest.update(str(self.size).encode())
+
+        if canvas is not None:
+            digest.update(canvas.image.tobytes())
+
+        return digest.hexdigest()
+
+    def render_frame(self):
+        self.polh.sync()
+        self.base.graphicsEngine.renderFrame()
+        self.rendered += 1
+        image = np.frombuffer(self.frame.getRamImage(), dtype=np.uint8)
+        return image.reshape(self.frame.getYSize(), self.frame.getXSize(), 4).copy()
+
+    def thumbnail(self, source, cache_dir=CACHE_DIR):
+        """Return a future of the thumbnail path, cached by content hash.
+           The scene is built only when the thumbnail is not cached.
+        """
+        model, canvas = self.read(source)
+        path = cache_dir / f'{self.content_hash(model, canvas)}.png'
+
+        if path.exists():
+            self.cache_hits += 1
+            return self.pool.submit(lambda: path)
+
+        self.show(model, canvas)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        return self.pool.submit(write_png, path, self.render_frame())
+
+    def turntable(self, source, frames, out_dir):
+        """Render frames rotated evenly through 360 degrees.
+        """
+        self.load(source)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        futures = []
+
+        for i in range(frames):
+            self.camera_np.setH(360 * i / frames)
+            path = out_dir / f'frame_{i:04d}.png'
+            futures.append(self.pool.submit(write_png, path, self.render_frame()))
+
+        self.camera_np.setH(0)
+        return futures
+
+
+def report(label, renderer, futures, start):
+    for future in futures:
+        future.result()
+
+    elapsed = time.perf_counter() - start
+    print(f'{label}: {renderer.rendered} frames rendered in {elapsed:.3f} s '
+          f'({renderer.rendered / elapsed:.1f} frames/sec), {renderer.cache_hits} cache hits')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=256, help='width and height of the images')
+    parser.add_argument('--software', action='store_true', help='render with the software renderer')
+    parser.add_argument('--workers', type=int, default=4, help='number of png encoding threads')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    thumbnails = subparsers.add_parser('thumbnails', help='render catalog thumbnails')
+    thumbnails.add_argument('category', nargs='?', help='name of a category; all if omitted')
+    thumbnails.add_argument('--files', nargs='+', help='bam files to render instead of a category')
+
+    turntable = subparsers.add_parser('turntable', help='render a turntable sequence')
+    turntable.add_argument('source', help='name of a polyhedron or path to a bam file')
+    turntable.add_argument('--frames', type=int, default=36)
+    turntable.add_argument('--out', type=Path, default=Path('turntable'))
+
+    args = parser.parse_args()
+    renderer = OffscreenRenderer(args.size, args.software, args.workers)
+    start = time.perf_counter()
+
+    match args.command:
+        case 'thumbnails':
+            if args.files:
+                names = args.files
+            else:
+                prefix = get_items()[args.category] if args.category else ''
+                names = [name for name in get_sub_items(prefix) if get_vertices(name)]
+            report('thumbnails', renderer, [renderer.thumbnail(name) for name in names], start)
+        case 'turntable':
+            report('turntable', renderer, renderer.turntable(args.source, args.frames, args.out), start)
@@ -0,0 +1,35 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+
+# the modules and polyhedrons.db live at the top of the repository
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
+
+
+@pytest.fixture(scope='session', params=['gl', 'software'])
+def renderer(request):
+    from panda3d.core import loadPrcFileData
+    from renderer import OffscreenRenderer
+
+    # a GSG must exist so that loaded models are premunged as in the app;
+    # OpenGL without a display, or the software renderer if that is missing
+    loadPrcFileData('', 'load-display p3headlessgl\naux-display p3tinydisplay')
+    renderer = OffscreenRenderer(64, software=request.param == 'software')
+    yield renderer
+
+    renderer.pool.shutdown()
+    renderer.base.destroy()
+
+
+def save(renderer, path):
+    from panda3d.core import NodePath, PandaNode
+
+    root = NodePath(PandaNode('root'))
+    obj = root.attachNewNode(renderer.polh.assemble())
+    renderer.polh.save_texture(obj, path)
+    root.writeBamFile(str(path))
@@ -0,0 +1,41 @@
+import time
+import tkinter
+
+from event_loop import EventPump
+
+
+class TclRoot(tkinter.Tk):
+    """Tcl without Tk, which needs a display; has the after timers and
+       dooneevent that the pump uses.
+    """
+
+    def __init__(self):
+        super().__init__(useTk=False)
+
+    def bind_all(self, sequence, func, add=None):
+        pass
+
+
+def test_user_exit_from_tk_callback_stops_pump(renderer):
+    base = renderer.base
+    base.tkRoot = TclRoot()
+    EventPump(base)
+    started = time.perf_counter()
+
+    def guard(task):
+        assert time.perf_counter() - started < 2, 'the pump did not stop'
+        return task.cont
+
+    # as the close button, Escape and File > close call it
+    base.tkRoot.after(20, base.userExit)
+    base.taskMgr.add(guard, 'guard')
+
+    try:
+        base.run()
+    finally:
+        for name in ('tkPump', 'tkPumpEndFrame', 'guard'):
+            base.taskMgr.remove(name)
+        del base.finalizeExit
+        base.tkRoot = None
+
+    assert not base.taskMgr.running
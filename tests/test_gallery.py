@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from gallery import Gallery
+from polyhedron_model import PolyhedronModel
+
+
+def test_no_phantom_model_when_everything_is_culled(renderer):
+    if not renderer.base.win.getGsg().getSupportsGlsl():
+        pytest.skip('no GLSL')
+
+    renderer.polh.clear()
+    gallery = Gallery(renderer.polh)
+    models = [PolyhedronModel.from_db('Cuboctahedron', renderer.polh.colors)] * 4
+    gallery.set_models(models)
+
+    # move the grid behind the camera, which looks at the origin from x = 15
+    gallery.offsets += np.float32([100, 0, 0])
+    gallery.centers += np.float32([100, 0, 0])
+
+    try:
+        gallery.update(renderer.base.cam)
+        assert not any(len(group.visible) for group in gallery.groups)
+        assert not len(gallery.proxy_visible)
+
+        image = renderer.render_frame()
+        assert (image == image[0, 0]).all()
+    finally:
+        gallery.removeNode()
@@ -0,0 +1,33 @@
+import numpy as np
+
+from history import ColorHistory
+from polyhedron_model import PolyhedronModel
+
+
+VERTICES = [(0, 0, 0), (1, 0, 0), (0, 1, 0), (0, 0, 1)]
+FACES = [(0, 1, 2), (0, 1, 3), (0, 2, 3), (1, 2, 3)]
+
+
+def paint(model, history, faces, color):
+    before = model.colors[faces].copy()
+    model.set_colors(faces, color)
+    return history.record(faces, before, model.colors[faces])
+
+
+def test_group_larger_than_buffer_keeps_history():
+    model = PolyhedronModel.from_faces(VERTICES, FACES)
+    history = ColorHistory(max_bytes=ColorHistory.RECORD.itemsize * 3)
+    white = model.colors.copy()
+
+    assert paint(model, history, [0], (1, 0, 0, 1))
+    assert paint(model, history, [1], (0, 1, 0, 1))
+    history.undo(model)
+    assert history.can_redo
+
+    # four faces do not fit in three records
+    assert not paint(model, history, [0, 1, 2, 3], (0, 0, 1, 1))
+    assert history.can_undo
+    assert not history.can_redo
+
+    history.undo(model)
+    np.testing.assert_array_equal(model.colors[0], white[0])
@@ -0,0 +1,64 @@
+import numpy as np
+
+from paint import PaintCanvas
+from conftest import save
+
+
+def test_save_load_round_trip(renderer, tmp_path):
+    renderer.load('Cuboctahedron')
+    renderer.polh.change_face_color(2, (1, 0, 0, 1))
+    saved = renderer.polh.model
+    path = tmp_path / 'cuboctahedron.bam'
+    save(renderer, path)
+
+    renderer.load(str(path))
+    loaded = renderer.polh.model
+
+    # a loaded model has its own vertex per corner, so compare the corners
+    np.testing.assert_array_equal(loaded.face_sizes, saved.face_sizes)
+    np.testing.assert_allclose(loaded.corners, saved.corners, atol=1e-6)
+    np.testing.assert_allclose(loaded.colors, saved.colors, atol=1 / 255)
+    assert renderer.polh.canvas is None
+
+
+def test_painting_round_trip(renderer, tmp_path):
+    renderer.load('Cuboctahedron')
+    renderer.polh.set_canvas(PaintCanvas(256))
+    renderer.polh.canvas.stroke_to((0.2, 0.3), (0, 0, 1, 1))
+    renderer.polh.canvas.stroke_to((0.4, 0.6), (0, 0, 1, 1))
+    renderer.render_frame()
+    painted = renderer.polh.canvas.image.copy()
+    path = tmp_path / 'painted.bam'
+    save(renderer, path)
+
+    # the painting is kept in a png next to the bam file
+    assert path.with_suffix('.png').exists()
+    assert path.stat().st_size < painted.nbytes
+
+    renderer.load(str(path))
+    np.testing.assert_array_equal(renderer.polh.canvas.image, painted)
+
+    # painting again and saving to the same path is not hidden by the texture pool
+    renderer.polh.canvas.stroke_to((0.7, 0.7), (1, 0, 0, 1))
+    painted = renderer.polh.canvas.image.copy()
+    save(renderer, path)
+    renderer.load(str(path))
+    np.testing.assert_array_equal(renderer.polh.canvas.image, painted)
+
+
+def test_painted_texture_matches_canvas(renderer):
+    renderer.load('Cuboctahedron')
+    renderer.polh.set_canvas(PaintCanvas(256))
+    canvas = renderer.polh.canvas
+
+    for uv in ((0.1, 0.1), (0.3, 0.2), (0.5, 0.5)):
+        canvas.stroke_to(uv, (0, 1, 0, 1))
+        renderer.render_frame()
+
+    # blitted on the GPU with OpenGL, or copied into the ram image by the software renderer
+    texture = renderer.polh.texture
+    if renderer.polh.blitter is not None:
+        renderer.base.graphicsEngine.extractTextureData(texture, renderer.base.win.getGsg())
+
+    image = np.frombuffer(texture.getRamImageAs('RGBA'), dtype=np.uint8)
+    np.testing.assert_array_equal(image.reshape(canvas.image.shape), canvas.image)
@@ -0,0 +1,160 @@
+import shutil
+import sqlite3
+from contextlib import closing
+
+import numpy as np
+import pytest
+
+import db_manage
+import polyhedron_model
+from db_manage import get_polyhedron
+from polyhedron_model import PolyhedronModel, load_derived, stored_polyhedrons
+
+
+NAME = 'Cuboctahedron'
+PALETTE = [(1, 1, 1, 1)] * 10
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """A copy of the database to store derived arrays in.
+    """
+    path = tmp_path / db_manage.DB_NAME
+    shutil.copy(db_manage.DB_NAME, path)
+    monkeypatch.setattr(db_manage, 'DB_NAME', str(path))
+    return path
+
+
+def derived_of(model):
+    return {key: getattr(model, key) for key in PolyhedronModel.DERIVED}
+
+
+def assert_derived_equal(derived, model):
+    for key in PolyhedronModel.DERIVED:
+        np.testing.assert_array_equal(derived[key], getattr(model, key), err_msg=key)
+
+
+def primitives(face_sizes):
+    """Triangles in the order of the per-face triangle, square and polygon
+       primitives that the model replaced.
+    """
+    start = 0
+
+    for n in face_sizes:
+        if n == 3:
+            yield (start, start + 1, start + 2)
+        elif n == 4:
+            yield from ((start + x, start + y, start + z) for x, y, z in [(2, 1, 0), (0, 3, 2)])
+        else:
+            yield (start, start + 1, start + 2)
+            yield from ((start + i - 1, start, start + i) for i in range(3, n))
+        start += n
+
+
+def shared_edges(faces):
+    edges = {}
+
+    for i, face in enumerate(faces):
+        for a, b in zip(face, face[1:] + face[:1]):
+            edges.setdefault((min(a, b), max(a, b)), []).append(i)
+
+    return {tuple(pair) for pair in edges.values() if len(pair) == 2}
+
+
+def test_triangles_wound_as_primitives():
+    for name, vertices, faces in stored_polyhedrons():
+        model = PolyhedronModel.from_faces(vertices, faces)
+        expected = list(primitives(len(face) for face in faces))
+
+        np.testing.assert_array_equal(model.triangles, expected, err_msg=name)
+        np.testing.assert_array_equal(
+            model.triangle_faces, np.repeat(np.arange(len(faces)), [len(f) - 2 for f in faces]))
+
+
+def test_adjacency_pairs_faces_sharing_an_edge():
+    for name, vertices, faces in stored_polyhedrons():
+        model = PolyhedronModel.from_faces(vertices, faces)
+        assert set(map(tuple, model.adjacency.tolist())) == shared_edges(faces), name
+
+
+def test_dirty_ranges_merge_until_popped():
+    model = PolyhedronModel.from_faces(*get_polyhedron(NAME)[:2])
+    assert model.pop_dirty() == (0, model.num_faces)
+    assert model.pop_dirty() is None
+
+    model.set_face_color(5, (1, 0, 0, 1))
+    model.set_face_color(2, (1, 0, 0, 1))
+    model.set_colors([7, 9], (0, 1, 0, 1))
+    assert model.pop_dirty() == (2, 10)
+
+    model.set_colors([], (0, 1, 0, 1))
+    assert model.pop_dirty() is None
+
+    model.mark_dirty(3, 4)
+    model.mark_dirty(8, 9)
+    assert model.pop_dirty() == (3, 9)
+
+
+def test_stored_arrays_equal_computed():
+    for name, vertices, faces in stored_polyhedrons():
+        model = PolyhedronModel.from_faces(vertices, faces)
+        *_, rows = get_polyhedron(name)
+        derived = load_derived(rows, model.geometry_hash())
+
+        assert derived is not None, name
+        assert_derived_equal(derived, model)
+
+
+def test_store_and_load_derived(database):
+    vertices, faces, _ = get_polyhedron(NAME)
+    model = PolyhedronModel.from_faces(vertices, faces)
+    model.store_derived(NAME)
+
+    *_, rows = get_polyhedron(NAME)
+    assert_derived_equal(load_derived(rows, model.geometry_hash()), model)
+    assert_derived_equal(derived_of(PolyhedronModel.from_db(NAME, PALETTE)), model)
+
+
+@pytest.mark.parametrize('stale', ['version', 'geometry', 'key'])
+def test_stale_arrays_are_not_loaded(database, monkeypatch, stale):
+    vertices, faces, _ = get_polyhedron(NAME)
+    model = PolyhedronModel.from_faces(vertices, faces)
+    model.store_derived(NAME)
+    *_, rows = get_polyhedron(NAME)
+    geometry = model.geometry_hash()
+
+    if stale == 'version':
+        monkeypatch.setattr(polyhedron_model, 'DERIVED_VERSION', polyhedron_model.DERIVED_VERSION + 1)
+    elif stale == 'geometry':
+        geometry = PolyhedronModel.from_faces(np.float32(vertices) * 2, faces).geometry_hash()
+    else:
+        rows = [row for row in rows if row[0] != 'adjacency']
+
+    assert load_derived(rows, geometry) is None
+
+
+def test_arrays_of_old_geometry_are_recomputed(database):
+    vertices, faces, _ = get_polyhedron(NAME)
+    PolyhedronModel.from_faces(vertices, faces).store_derived(NAME)
+
+    # the geometry changes after the arrays were stored
+    with closing(sqlite3.connect(database)) as conn:
+        conn.execute(
+            'UPDATE vertices SET vertex = ? WHERE row_num = 0 AND id = '
+            '(SELECT id FROM polyhedrons WHERE name = ?)', ((1.0, 2.0, 3.0), NAME))
+        conn.commit()
+
+    vertices[0] = (1.0, 2.0, 3.0)
+    assert_derived_equal(
+        derived_of(PolyhedronModel.from_db(NAME, PALETTE)), PolyhedronModel.from_faces(vertices, faces))
+
+
+def test_load_without_derived_table(database):
+    with closing(sqlite3.connect(database)) as conn:
+        conn.execute('DROP TABLE derived')
+        conn.commit()
+
+    vertices, faces, rows = get_polyhedron(NAME)
+    assert rows == []
+    assert_derived_equal(
+        derived_of(PolyhedronModel.from_db(NAME, PALETTE)), PolyhedronModel.from_faces(vertices, faces))
@@ -0,0 +1,29 @@
+from conftest import save
+
+
+def test_thumbnail_of_bam_file_is_cached(renderer, tmp_path):
+    renderer.load('Cuboctahedron')
+    renderer.polh.change_face_color(0, (0, 1, 0, 1))
+    path = tmp_path / 'cuboctahedron.bam'
+    save(renderer, path)
+    renderer.polh.clear()
+
+    rendered, cache_hits = renderer.rendered, renderer.cache_hits
+    first = renderer.thumbnail(str(path), tmp_path).result()
+    assert first.exists()
+    assert (renderer.rendered, renderer.cache_hits) == (rendered + 1, cache_hits)
+
+    # a cache hit neither renders nor builds the scene
+    renderer.polh.clear()
+    assert renderer.thumbnail(str(path), tmp_path).result() == first
+    assert (renderer.rendered, renderer.cache_hits) == (rendered + 1, cache_hits + 1)
+    assert renderer.polh.model is None
+
+
+def test_turntable_of_bam_file(renderer, tmp_path):
+    renderer.load('Cuboctahedron')
+    path = tmp_path / 'cuboctahedron.bam'
+    save(renderer, path)
+
+    futures = renderer.turntable(str(path), 4, tmp_path / 'turntable')
+    assert all(future.result().exists() for future in futures)
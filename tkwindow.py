@@ -55,9 +55,14 @@ class WindowTk(ttk.Frame):
         menu_file = tk.Menu(menubar, tearoff=False)
         menu_file.add_command(label='Open File', command=self.open_file, accelerator='Ctrl+O')
         menu_file.add_command(label='Save As', command=self.save_file, accelerator='Ctrl+S')
+        menu_file.add_command(label='Open Gallery', command=self.open_gallery)
         menu_file.add_separator()
         menu_file.add_command(label='close', command=self.close)
         menubar.add_cascade(label="File", menu=menu_file)
+        menu_edit = tk.Menu(menubar, tearoff=False)
+        menu_edit.add_command(label='Undo', command=self.panda_app.undo, accelerator='Ctrl+Z')
+        menu_edit.add_command(label='Redo', command=self.panda_app.redo, accelerator='Ctrl+Y')
+        menubar.add_cascade(label="Edit", menu=menu_edit)
         self.master.config(menu=menubar)
 
     def make_gui(self):
@@ -102,9 +107,10 @@ class WindowTk(ttk.Frame):
     def make_gradation_picker(self):
         frame = ttk.Frame(self)
         frame.pack(side=tk.TOP, padx=10, pady=10)
-        self.r_picker = GradationPicker('R', self.make_color, frame)
-        self.g_picker = GradationPicker('G', self.make_color, frame)
-        self.b_picker = GradationPicker('B', self.make_color, frame)
+        post = self.panda_app.events.post
+        self.r_picker = GradationPicker('R', self.make_color, frame, post)
+        self.g_picker = GradationPicker('G', self.make_color, frame, post)
+        self.b_picker = GradationPicker('B', self.make_color, frame, post)
 
     def make_button(self):
         frame = ttk.Frame(self)
@@ -130,22 +136,34 @@ class WindowTk(ttk.Frame):
                 frame, text=text, value=val, variable=self.var_radio, command=self.toggle_radio)
             radio_btn.grid(column=i, row=0, pady=5)
 
+        self.var_mode = tk.IntVar(value=0)
+        label_mode = ttk.Label(frame, text='Mode : ')
+        label_mode.grid(column=0, row=1, pady=5)
+
+        for i, (text, val) in enumerate(zip(['Fill', 'Paint'], [0, 1]), start=1):
+            radio_btn = ttk.Radiobutton(
+                frame, text=text, value=val, variable=self.var_mode, command=self.toggle_mode)
+            radio_btn.grid(column=i, row=1, pady=5)
+
         self.items = get_items()
         item_list = list(self.items.keys())
         self.item_combobox = ttk.Combobox(
             frame, values=item_list, justify='left', state='readonly', height=10, width=35)
-        self.item_combobox.grid(column=0, row=1, columnspan=3, pady=5)
+        self.item_combobox.grid(column=0, row=2, columnspan=3, pady=5)
         self.item_combobox.bind('<<ComboboxSelected>>', self.change_items)
         self.item_combobox.set(item_list[0])
 
         self.subitem_combobox = ttk.Combobox(
             frame, justify='left', state='readonly', height=10, width=35)
-        self.subitem_combobox.grid(column=0, row=2, columnspan=3, pady=5)
+        self.subitem_combobox.grid(column=0, row=3, columnspan=3, pady=5)
         self.subitem_combobox.bind('<<ComboboxSelected>>', self.show_coloring_pic)
         self.change_items()
 
         btn = tk.Button(frame, text='Save', width=32, command=self.save_file)
-        btn.grid(column=0, row=3, columnspan=3, pady=5)
+        btn.grid(column=0, row=4, columnspan=3, pady=5)
+
+        btn = tk.Button(frame, text='Gallery', width=32, command=self.show_gallery)
+        btn.grid(column=0, row=5, columnspan=3, pady=5)
 
     def show_selected_color(self, event):
         if color := event.widget.cget('background'):
@@ -174,6 +192,10 @@ class WindowTk(ttk.Frame):
         self.created_color_label.configure(background=new_color)
 
     def save_file(self):
+        if self.panda_app.gallery.active:
+            messagebox.showinfo('info', 'Select a polyhedron to save.')
+            return
+
         if self.opend_file_name:
             initialfile = self.opend_file_name
         else:
@@ -200,6 +222,17 @@ class WindowTk(ttk.Frame):
 
             self.panda_app.open_file(filepath)
 
+    def open_gallery(self):
+        if filepaths := filedialog.askopenfilenames(
+                title='Open gallery',
+                filetypes=[('bam', '.bam')],
+                initialdir='./'):
+            self.panda_app.open_gallery([Path(filepath) for filepath in filepaths])
+
+    def show_gallery(self):
+        names = self.subitem_combobox.cget('values')
+        self.panda_app.show_category_gallery(names)
+
     def show_coloring_pic(self, event=None):
         name = self.subitem_combobox.get()
         self.opend_file_name = None
@@ -216,17 +249,24 @@ class WindowTk(ttk.Frame):
         outline = self.var_radio.get()
         self.panda_app.toggle_debug(outline)
 
+    def toggle_mode(self, event=None):
+        paint_mode = self.var_mode.get()
+        self.panda_app.toggle_paint(paint_mode)
+
     def close(self, event=None):
-        self.quit()
+        self.panda_app.userExit()
 
 
 class GradationPicker(ttk.Frame):
 
-    def __init__(self, text, func, master):
+    def __init__(self, text, func, master, post):
+        """post: function to coalesce the scale ticks into one update per frame
+        """
         super().__init__(master)
         self.pack(side=tk.TOP)
         self.make_picker(text)
         self.make_color = func
+        self.post = post
         self.text = text
 
     def make_picker(self, text):
@@ -241,6 +281,9 @@ class GradationPicker(ttk.Frame):
         self.scale.grid(row=1, column=3)
 
     def display_value(self, value):
+        self.post(self, self.apply_value, value)
+
+    def apply_value(self, value):
         value = int(float(value))
         self.var.set(value)
         self.entry.icursor(len(self.var.get()))